@@ -31,12 +31,16 @@ Removed Stages (rely on API validation instead):
 """
 
 import json
+import os
 import re
+import threading
 import torch
+from collections import OrderedDict
 from typing import Dict, Any, List, Optional
 from datetime import datetime
+from time import perf_counter
 
-from app.llama_utils import get_llama_processor
+from app.llama_utils import get_llama_processor, json_loads
 from app.schema_loader import get_stage_2_5_schema, get_stage_1_schema, get_stage_4_schema
 
 # Import logging
@@ -45,8 +49,14 @@ logger = logging.getLogger(__name__)
 
 # Outlines for grammar-constrained generation (imported lazily to avoid startup overhead)
 _outlines_available = False
-_outlines_model = None
-_outlines_generators = {}
+_outlines_model = None  # (transformers model, Outlines wrapper around it)
+# id(schema) -> (schema, Outlines Generator): the FSM is compiled once per schema. Schemas
+# come memoized from schema_loader, so id() is a stable key; holding the schema keeps its
+# id from being reused. Bounded LRU - each compiled FSM is large and there are 200+ actions
+OUTLINES_GENERATOR_CACHE_SIZE = int(os.getenv("ZOPILOT_OUTLINES_GENERATOR_CACHE_SIZE", "32"))
+_outlines_generators: "OrderedDict[int, tuple]" = OrderedDict()
+# Guards misses: concurrent first requests for a schema compile its FSM once
+_outlines_generators_lock = threading.Lock()
 
 def _init_outlines():
     """Initialize Outlines library (lazy loading)."""
@@ -139,7 +149,7 @@ def classify_stage1(prompt: str, context: Dict[str, Any], generation_config: Opt
         # ============================================================================
         # PRIORITY 1: Try Outlines grammar-constrained generation (if enabled)
         # ============================================================================
-        if use_outlines and _init_outlines():
+        if use_outlines and processor.model is not None and _init_outlines():
             logger.info("🎯 [Stage 1] Attempting Outlines grammar-constrained generation...")
             
             # Load Stage 1 schema
@@ -165,12 +175,7 @@ def classify_stage1(prompt: str, context: Dict[str, Any], generation_config: Opt
                     logger.info(f"   Business relevant: {result.get('business_relevant')}")
                     logger.info(f"   Selected action: {result.get('selected_action')}")
                     logger.info(f"   Confidence: {result.get('confidence')}%")
-                    
-                    # Clear KV cache
-                    if hasattr(model, 'past_key_values'):
-                        model.past_key_values = None
-                    torch.cuda.empty_cache()
-                    
+                                        
                     return result
                 else:
                     logger.warning("⚠️  [Stage 1] Outlines failed, falling back to standard generation...")
@@ -198,29 +203,27 @@ START IMMEDIATELY with opening brace.
         
         # Tokenize input with CONFIGURABLE max_input_length
         logger.info("🔢 [Stage 1] Tokenizing prompt...")
-        inputs = processor.tokenizer(formatted_prompt, return_tensors="pt", truncation=True, max_length=max_input_length)
-        inputs = {k: v.to(processor.model.device) for k, v in inputs.items()}
+        inputs = processor.to_device(processor.tokenizer(formatted_prompt, return_tensors="pt", truncation=True, max_length=max_input_length))
         input_tokens = len(inputs["input_ids"][0])
         logger.info(f"   Input tokens: {input_tokens}")
         
         # Generate response with CONFIGURABLE parameters
         logger.info(f"🚀 [Stage 1] Generating classification response (max {max_new_tokens} tokens)...")
-        gen_start = __import__('time').time()
-        
-        with torch.no_grad():
-            outputs = processor.model.generate(
-                **inputs,
-                max_new_tokens=max_new_tokens,        # ✅ From request (backend sends 2500)
-                temperature=temperature,              # ✅ From request (backend sends 0.1)
-                do_sample=temperature > 0,            # Only sample if temp > 0
-                top_p=top_p,                         # ✅ From request
-                top_k=top_k,                         # ✅ From request
-                repetition_penalty=repetition_penalty, # ✅ From request
-                pad_token_id=processor.tokenizer.eos_token_id,
-                eos_token_id=processor.tokenizer.eos_token_id
-            )
-        
-        gen_time = __import__('time').time() - gen_start
+        gen_start = perf_counter()
+        
+        outputs = processor.generate_batched(
+            inputs,
+            max_new_tokens=max_new_tokens,        # ✅ From request (backend sends 2500)
+            temperature=temperature,              # ✅ From request (backend sends 0.1)
+            do_sample=temperature > 0,            # Only sample if temp > 0
+            top_p=top_p,                         # ✅ From request
+            top_k=top_k,                         # ✅ From request
+            repetition_penalty=repetition_penalty, # ✅ From request
+            pad_token_id=processor.tokenizer.eos_token_id,
+            eos_token_id=processor.tokenizer.eos_token_id
+        )
+        
+        gen_time = perf_counter() - gen_start
         output_tokens = len(outputs[0]) - input_tokens
         tokens_per_sec = output_tokens / gen_time if gen_time > 0 else 0
         logger.info(f"✅ [Stage 1] Generated {output_tokens} tokens in {gen_time:.1f}s ({tokens_per_sec:.1f} tok/s)")
@@ -237,17 +240,11 @@ START IMMEDIATELY with opening brace.
         response_text = "{" + decoded_output
         logger.info(f"   Response length: {len(response_text)} chars (prepended opening brace)")
         
-        # CRITICAL: Clear KV cache to prevent memory leak
-        if hasattr(processor.model, 'past_key_values'):
-            processor.model.past_key_values = None
-        torch.cuda.empty_cache()
-        torch.cuda.synchronize()
-        
-        # Report memory after cleanup
-        if torch.cuda.is_available():
+        # Report memory after generation
+        if torch.cuda.is_available() and logger.isEnabledFor(logging.DEBUG):
             allocated = torch.cuda.memory_allocated(0) / (1024**3)
             reserved = torch.cuda.memory_reserved(0) / (1024**3)
-            logger.info(f"🧹 KV cache cleared: {allocated:.2f}GB allocated, {reserved:.2f}GB reserved")
+            logger.debug(f"💾 GPU memory: {allocated:.2f}GB allocated, {reserved:.2f}GB reserved")
         
         # Parse JSON response
         logger.info("🔍 [Stage 1] Parsing JSON response...")
@@ -275,18 +272,12 @@ START IMMEDIATELY with opening brace.
         
         return result
         
+    except torch.cuda.OutOfMemoryError:
+        raise  # Not wrapped - the API maps it to 507 and compacts GPU memory
+    
     except Exception as e:
         logger.error(f"❌ [Stage 1] Classification failed: {str(e)}")
         
-        # CRITICAL: Clean up KV cache even on error
-        try:
-            if hasattr(processor.model, 'past_key_values'):
-                processor.model.past_key_values = None
-            torch.cuda.empty_cache()
-            logger.info("🧹 KV cache cleared after error")
-        except:
-            pass
-        
         raise RuntimeError(f"Stage 1 classification failed: {str(e)}") from e
 
 
@@ -304,29 +295,41 @@ def _generate_with_outlines(prompt: str, schema: Dict[str, Any], model, tokenize
     Returns:
         Parsed JSON dict or None if generation fails
     """
+    global _outlines_model
     try:
         from outlines import from_transformers, Generator
         from outlines.types import JsonSchema
-        import json
         
         logger.info("🎯 [Outlines] Starting grammar-constrained generation...")
-        gen_start = __import__('time').time()
-        
-        # Wrap model with Outlines (this is fast, ~10ms)
-        outlines_model = from_transformers(model, tokenizer)
-        
-        # Create JSON generator with schema constraint
-        # This builds FSM (can take 300-800ms first time, then cached)
-        generator = Generator(outlines_model, JsonSchema(json.dumps(schema)))
+        gen_start = perf_counter()
+        
+        # Create JSON generator with schema constraint - building its FSM takes
+        # 300-800ms, so keep one generator per schema instead of one per request
+        with _outlines_generators_lock:
+            # Wrap model with Outlines once per loaded model
+            if _outlines_model is None or _outlines_model[0] is not model:
+                _outlines_model = (model, from_transformers(model, tokenizer))
+                _outlines_generators.clear()
+            
+            cached = _outlines_generators.get(id(schema))
+            if cached is not None and cached[0] is schema:
+                _outlines_generators.move_to_end(id(schema))
+                generator = cached[1]
+            else:
+                generator = Generator(_outlines_model[1], JsonSchema(json.dumps(schema)))
+                _outlines_generators[id(schema)] = (schema, generator)
+                if len(_outlines_generators) > OUTLINES_GENERATOR_CACHE_SIZE:
+                    _outlines_generators.popitem(last=False)
         
-        # Generate - output is GUARANTEED to match schema
-        result_json = generator(prompt, max_new_tokens=max_tokens)
+        # Generate - output is GUARANTEED to match schema. Runs on the GPU worker like every
+        # other generate() on this model, never concurrently with a batch
+        result_json = get_llama_processor().run_on_gpu_worker(generator, prompt, max_new_tokens=max_tokens)
         
-        gen_time = __import__('time').time() - gen_start
+        gen_time = perf_counter() - gen_start
         logger.info(f"✅ [Outlines] Generated valid JSON in {gen_time:.1f}s")
         
         # Parse the JSON string result
-        result = json.loads(result_json)
+        result = json_loads(result_json)
         logger.info(f"   Result type: {type(result)}")
         logger.info(f"   Result keys: {result.keys() if isinstance(result, dict) else 'N/A'}")
         
@@ -418,7 +421,7 @@ def classify_stage2_5_entity_extraction(prompt: str, context: Dict[str, Any], ge
         # ============================================================================
         # PRIORITY 1: Try Outlines grammar-constrained generation (if enabled)
         # ============================================================================
-        if use_outlines and _init_outlines():
+        if use_outlines and processor.model is not None and _init_outlines():
             logger.info("🎯 [Stage 2.5] Attempting Outlines grammar-constrained generation...")
             
             # Load Stage 2.5 schema
@@ -443,12 +446,7 @@ def classify_stage2_5_entity_extraction(prompt: str, context: Dict[str, Any], ge
                     logger.info("✅ [Stage 2.5] Outlines generation successful!")
                     logger.info(f"   Entities extracted: {len(result.get('entities_to_resolve', []))}")
                     logger.info(f"   Total entities: {result.get('extraction_metadata', {}).get('total_entities', 0)}")
-                    
-                    # Clear KV cache
-                    if hasattr(model, 'past_key_values'):
-                        model.past_key_values = None
-                    torch.cuda.empty_cache()
-                    
+                                        
                     return result
                 else:
                     logger.warning("⚠️  [Stage 2.5] Outlines failed, falling back to standard generation...")
@@ -476,34 +474,32 @@ START IMMEDIATELY with opening brace.
         
         # Tokenize with CONFIGURABLE max_input_length (same as Stage 1)
         logger.info("🔢 [Stage 2.5] Tokenizing prompt...")
-        inputs = tokenizer(formatted_prompt, return_tensors="pt", truncation=True, max_length=max_input_length)
-        inputs = {k: v.to(model.device) for k, v in inputs.items()}
+        inputs = processor.to_device(tokenizer(formatted_prompt, return_tensors="pt", truncation=True, max_length=max_input_length))
         input_tokens = len(inputs["input_ids"][0])
         logger.info(f"   Input tokens: {input_tokens}")
         
         logger.info(f"🚀 [Stage 2.5] Generating entity extraction (max {max_new_tokens} tokens)...")
-        gen_start = __import__('time').time()
+        gen_start = perf_counter()
         
         # ✅ FIX: Set minimum tokens to prevent premature stopping
         # Stage 2.5 entity extraction needs at least 150-200 tokens for valid JSON
         min_tokens_required = 150
         
         # Generate response
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs,
-                max_new_tokens=max_new_tokens,
-                min_new_tokens=min_tokens_required,  # ✅ NEW: Force minimum generation length
-                temperature=temperature,
-                do_sample=temperature > 0,
-                top_p=top_p,
-                top_k=top_k,
-                repetition_penalty=repetition_penalty,
-                pad_token_id=tokenizer.eos_token_id,
-                eos_token_id=tokenizer.eos_token_id
-            )
-        
-        gen_time = __import__('time').time() - gen_start
+        outputs = processor.generate_batched(
+            inputs,
+            max_new_tokens=max_new_tokens,
+            min_new_tokens=min_tokens_required,  # ✅ NEW: Force minimum generation length
+            temperature=temperature,
+            do_sample=temperature > 0,
+            top_p=top_p,
+            top_k=top_k,
+            repetition_penalty=repetition_penalty,
+            pad_token_id=tokenizer.eos_token_id,
+            eos_token_id=tokenizer.eos_token_id
+        )
+        
+        gen_time = perf_counter() - gen_start
         output_tokens = len(outputs[0]) - input_tokens
         tokens_per_sec = output_tokens / gen_time if gen_time > 0 else 0
         logger.info(f"✅ [Stage 2.5] Generated {output_tokens} tokens in {gen_time:.1f}s ({tokens_per_sec:.1f} tok/s)")
@@ -528,17 +524,10 @@ START IMMEDIATELY with opening brace.
             response_text = response_text.rstrip() + (']' * open_brackets) + ('}' * open_braces)
             logger.info(f"   ✅ Auto-completed to {len(response_text)} chars")
         
-        # CRITICAL: Clear KV cache after generation to prevent memory leaks
-        # KV cache can grow to 4-8GB and stays in VRAM if not cleared
-        if hasattr(model, 'past_key_values'):
-            model.past_key_values = None
-        torch.cuda.empty_cache()
-        torch.cuda.synchronize()  # Ensure cleanup completes before continuing
-        
-        if torch.cuda.is_available():
+        if torch.cuda.is_available() and logger.isEnabledFor(logging.DEBUG):
             allocated = torch.cuda.memory_allocated(0) / (1024**3)
             reserved = torch.cuda.memory_reserved(0) / (1024**3)
-            logger.info(f"🧹 [Stage 2.5] KV cache cleared: {allocated:.2f}GB allocated, {reserved:.2f}GB reserved")
+            logger.debug(f"💾 [Stage 2.5] GPU memory: {allocated:.2f}GB allocated, {reserved:.2f}GB reserved")
         
         # Parse JSON using centralized parser (same as Stage 1)
         logger.info("🔍 [Stage 2.5] Parsing JSON response...")
@@ -594,23 +583,14 @@ START IMMEDIATELY with opening brace.
         logger.error(f"Response text: {response_text[:1000]}")
         raise ValueError(f"Stage 2.5 returned invalid JSON: {str(e)}") from e
     
+    except torch.cuda.OutOfMemoryError:
+        raise  # Not wrapped - the API maps it to 507 and compacts GPU memory
+    
     except Exception as e:
         logger.error(f"❌ Stage 2.5 failed: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
         
-        # CRITICAL: Clean up KV cache and GPU memory on error to prevent memory leaks
-        try:
-            if 'model' in locals() and hasattr(model, 'past_key_values'):
-                model.past_key_values = None
-        except:
-            pass
-        
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-            torch.cuda.synchronize()
-            logger.info("🧹 [Stage 2.5] GPU memory cleaned after error")
-        
         raise RuntimeError(f"Stage 2.5 entity extraction failed: {str(e)}") from e
 
 
@@ -721,7 +701,7 @@ def classify_stage2(prompt: str, context: Dict[str, Any], generation_config: Opt
         # ============================================================================
         # PRIORITY 1: Try Outlines grammar-constrained generation (if enabled)
         # ============================================================================
-        if use_outlines and _init_outlines():
+        if use_outlines and processor.model is not None and _init_outlines():
             logger.info("🎯 [Stage 4] Attempting Outlines grammar-constrained generation...")
             
             # Determine if batch and extract action names
@@ -780,12 +760,7 @@ def classify_stage2(prompt: str, context: Dict[str, Any], generation_config: Opt
                         logger.info(f"   Actions generated: {len(result.get('actions', []))}")
                     else:
                         logger.info(f"   Lookups required: {len(result.get('lookups_required', []))}")
-                    
-                    # Clear KV cache
-                    if hasattr(model, 'past_key_values'):
-                        model.past_key_values = None
-                    torch.cuda.empty_cache()
-                    
+                                        
                     return result
                 else:
                     logger.warning("⚠️  [Stage 4] Outlines failed, falling back to standard generation...")
@@ -813,29 +788,27 @@ START IMMEDIATELY with opening brace.
         
         # Tokenize with CONFIGURABLE max_input_length
         logger.info("🔢 [Stage 4] Tokenizing prompt...")
-        inputs = processor.tokenizer(formatted_prompt, return_tensors="pt", truncation=True, max_length=max_input_length)
-        inputs = {k: v.to(processor.model.device) for k, v in inputs.items()}
+        inputs = processor.to_device(processor.tokenizer(formatted_prompt, return_tensors="pt", truncation=True, max_length=max_input_length))
         input_tokens = len(inputs["input_ids"][0])
         logger.info(f"   Input tokens: {input_tokens}")
         
         # Generate with CONFIGURABLE parameters
         logger.info(f"🚀 [Stage 4] Generating field mappings (max {max_new_tokens} tokens)...")
-        gen_start = __import__('time').time()
-        
-        with torch.no_grad():
-            outputs = processor.model.generate(
-                **inputs,
-                max_new_tokens=max_new_tokens,        # ✅ From request (backend sends 3000)
-                temperature=temperature,              # ✅ From request (backend sends 0.05)
-                do_sample=temperature > 0,            # Only sample if temp > 0
-                top_p=top_p,                         # ✅ From request
-                top_k=top_k,                         # ✅ From request
-                repetition_penalty=repetition_penalty, # ✅ From request
-                pad_token_id=processor.tokenizer.eos_token_id,
-                eos_token_id=processor.tokenizer.eos_token_id
-            )
-        
-        gen_time = __import__('time').time() - gen_start
+        gen_start = perf_counter()
+        
+        outputs = processor.generate_batched(
+            inputs,
+            max_new_tokens=max_new_tokens,        # ✅ From request (backend sends 3000)
+            temperature=temperature,              # ✅ From request (backend sends 0.05)
+            do_sample=temperature > 0,            # Only sample if temp > 0
+            top_p=top_p,                         # ✅ From request
+            top_k=top_k,                         # ✅ From request
+            repetition_penalty=repetition_penalty, # ✅ From request
+            pad_token_id=processor.tokenizer.eos_token_id,
+            eos_token_id=processor.tokenizer.eos_token_id
+        )
+        
+        gen_time = perf_counter() - gen_start
         output_tokens = len(outputs[0]) - input_tokens
         tokens_per_sec = output_tokens / gen_time if gen_time > 0 else 0
         logger.info(f"✅ [Stage 4] Generated {output_tokens} tokens in {gen_time:.1f}s ({tokens_per_sec:.1f} tok/s)")
@@ -857,17 +830,11 @@ START IMMEDIATELY with opening brace.
         logger.info(f"   Response length: {len(response_text)} chars (prepended opening brace)")
         logger.info(f"   Raw decoded response: {response_text[:200]}...")
         
-        # CRITICAL: Clear KV cache
-        if hasattr(processor.model, 'past_key_values'):
-            processor.model.past_key_values = None
-        torch.cuda.empty_cache()
-        torch.cuda.synchronize()
-        
         # Report memory
-        if torch.cuda.is_available():
+        if torch.cuda.is_available() and logger.isEnabledFor(logging.DEBUG):
             allocated = torch.cuda.memory_allocated(0) / (1024**3)
             reserved = torch.cuda.memory_reserved(0) / (1024**3)
-            logger.info(f"🧹 KV cache cleared: {allocated:.2f}GB allocated, {reserved:.2f}GB reserved")
+            logger.debug(f"💾 GPU memory: {allocated:.2f}GB allocated, {reserved:.2f}GB reserved")
         
         # Parse JSON
         logger.info("🔍 [Stage 4] Parsing JSON response...")
@@ -878,11 +845,6 @@ START IMMEDIATELY with opening brace.
             if output_tokens < 100 or "No JSON object found" in str(parse_error):
                 logger.warning(f"⚠️  [Stage 4] First attempt failed (low tokens or no JSON), retrying with stronger enforcement...")
                 
-                # Clear cache before retry
-                if hasattr(processor.model, 'past_key_values'):
-                    processor.model.past_key_values = None
-                torch.cuda.empty_cache()
-                
                 # Retry with even stronger JSON enforcement and zero temperature
                 retry_prompt = f"""<s>[INST] {prompt}
 
@@ -902,22 +864,20 @@ Generate JSON immediately:
 
 [/INST]{{"""
                 
-                retry_inputs = processor.tokenizer(retry_prompt, return_tensors="pt", truncation=True, max_length=max_input_length)
-                retry_inputs = {k: v.to(processor.model.device) for k, v in retry_inputs.items()}
+                retry_inputs = processor.to_device(processor.tokenizer(retry_prompt, return_tensors="pt", truncation=True, max_length=max_input_length))
                 
                 logger.info("🔄 [Stage 4] Retry generation with stronger JSON enforcement...")
-                with torch.no_grad():
-                    retry_outputs = processor.model.generate(
-                        **retry_inputs,
-                        max_new_tokens=max_new_tokens,
-                        temperature=0.0,  # Zero temperature for maximum determinism - no sampling
-                        do_sample=False,  # Greedy decoding only
-                        top_p=0.9,
-                        top_k=40,
-                        repetition_penalty=1.2,
-                        pad_token_id=processor.tokenizer.eos_token_id,
-                        eos_token_id=processor.tokenizer.eos_token_id
-                    )
+                retry_outputs = processor.generate_batched(
+                    retry_inputs,
+                    max_new_tokens=max_new_tokens,
+                    temperature=0.0,  # Zero temperature for maximum determinism - no sampling
+                    do_sample=False,  # Greedy decoding only
+                    top_p=0.9,
+                    top_k=40,
+                    repetition_penalty=1.2,
+                    pad_token_id=processor.tokenizer.eos_token_id,
+                    eos_token_id=processor.tokenizer.eos_token_id
+                )
                 
                 retry_decoded = processor.tokenizer.decode(
                     retry_outputs[0][len(retry_inputs["input_ids"][0]):], 
@@ -946,19 +906,12 @@ Generate JSON immediately:
         
         return result
         
+    except torch.cuda.OutOfMemoryError:
+        raise  # Not wrapped - the API maps it to 507 and compacts GPU memory
+    
     except Exception as e:
         logger.error(f"❌ [Stage 4] Field mapping failed for {action_name}: {str(e)}")
         
-        # CRITICAL: Clean up KV cache even on error
-        try:
-            processor = get_llama_processor()
-            if hasattr(processor.model, 'past_key_values'):
-                processor.model.past_key_values = None
-            torch.cuda.empty_cache()
-            logger.info("🧹 KV cache cleared after error")
-        except:
-            pass
-        
         raise RuntimeError(f"Stage 2 field mapping failed: {str(e)}") from e
 
 
@@ -1163,7 +1116,7 @@ def _parse_classification_response(response: str, stage: float) -> Dict[str, Any
         json_str = _repair_malformed_json(json_str, stage)
         
         # Try to parse the repaired JSON
-        parsed = json.loads(json_str)
+        parsed = json_loads(json_str)
         
         logger.info(f"✅ Successfully parsed Stage {stage} JSON ({len(json_str)} chars)")
         return parsed
@@ -1184,7 +1137,7 @@ def _parse_classification_response(response: str, stage: float) -> Dict[str, Any
                 logger.warning(f"   Found potential JSON ({len(largest_json)} chars)")
                 # Try to repair and parse the extracted JSON
                 largest_json = _repair_malformed_json(largest_json, stage)
-                parsed = json.loads(largest_json)
+                parsed = json_loads(largest_json)
                 logger.info(f"✅ Successfully extracted JSON using regex fallback")
                 return parsed
         except Exception as fallback_error:
@@ -1495,31 +1448,27 @@ def classify_stage0_5_math(prompt: str, context: Dict[str, Any], generation_conf
             logger.info(f"[Stage 0.5] Prompt length: {len(prompt_tokens)} tokens (within limit)")
         
         # Tokenize with chat template
-        inputs = tokenizer.apply_chat_template(
+        inputs = processor.to_device(tokenizer.apply_chat_template(
             [{"role": "user", "content": prompt}],
             add_generation_prompt=True,
             return_tensors="pt",
             return_dict=True
-        )
-        
-        if torch.cuda.is_available():
-            inputs = {k: v.cuda() for k, v in inputs.items()}
+        ))
         
         logger.info(f"[Stage 0.5] Generating with {inputs['input_ids'].shape[1]} input tokens...")
         
         # Generate response
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs,
-                max_new_tokens=max_new_tokens,
-                temperature=temperature,
-                top_p=top_p,
-                top_k=top_k,
-                repetition_penalty=repetition_penalty,
-                do_sample=True if temperature > 0 else False,
-                pad_token_id=tokenizer.eos_token_id,
-                eos_token_id=tokenizer.eos_token_id
-            )
+        outputs = processor.generate_batched(
+            inputs,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            top_k=top_k,
+            repetition_penalty=repetition_penalty,
+            do_sample=True if temperature > 0 else False,
+            pad_token_id=tokenizer.eos_token_id,
+            eos_token_id=tokenizer.eos_token_id
+        )
         
         # Decode response
         full_output = tokenizer.decode(outputs[0], skip_special_tokens=True)
@@ -1533,17 +1482,10 @@ def classify_stage0_5_math(prompt: str, context: Dict[str, Any], generation_conf
         logger.info(f"[Stage 0.5] Generated {len(response_text)} characters")
         logger.debug(f"[Stage 0.5] Raw response: {response_text[:500]}...")
         
-        # CRITICAL: Clear KV cache after generation to prevent memory leaks
-        # KV cache can grow to 4-8GB and stays in VRAM if not cleared
-        if hasattr(model, 'past_key_values'):
-            model.past_key_values = None
-        torch.cuda.empty_cache()
-        torch.cuda.synchronize()  # Ensure cleanup completes before continuing
-        
-        if torch.cuda.is_available():
+        if torch.cuda.is_available() and logger.isEnabledFor(logging.DEBUG):
             allocated = torch.cuda.memory_allocated(0) / (1024**3)
             reserved = torch.cuda.memory_reserved(0) / (1024**3)
-            logger.info(f"🧹 [Stage 0.5] KV cache cleared: {allocated:.2f}GB allocated, {reserved:.2f}GB reserved")
+            logger.debug(f"💾 [Stage 0.5] GPU memory: {allocated:.2f}GB allocated, {reserved:.2f}GB reserved")
         
         # Parse JSON response
         json_match = re.search(r'\{[\s\S]*\}', response_text)
@@ -1551,7 +1493,7 @@ def classify_stage0_5_math(prompt: str, context: Dict[str, Any], generation_conf
             logger.error("❌ Stage 0.5: No JSON found in response")
             raise ValueError("Stage 0.5 response did not contain valid JSON")
         
-        response = json.loads(json_match.group(0))
+        response = json_loads(json_match.group(0))
         logger.info("[Stage 0.5] ✅ JSON parsed successfully")
         
         # Validate response structure
@@ -1582,23 +1524,14 @@ def classify_stage0_5_math(prompt: str, context: Dict[str, Any], generation_conf
         logger.error(f"Response text: {response_text[:1000]}")
         raise ValueError(f"Stage 0.5 returned invalid JSON: {str(e)}") from e
     
+    except torch.cuda.OutOfMemoryError:
+        raise  # Not wrapped - the API maps it to 507 and compacts GPU memory
+    
     except Exception as e:
         logger.error(f"❌ Stage 0.5 failed: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
         
-        # CRITICAL: Clean up KV cache and GPU memory on error to prevent memory leaks
-        try:
-            if 'model' in locals() and hasattr(model, 'past_key_values'):
-                model.past_key_values = None
-        except:
-            pass
-        
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-            torch.cuda.synchronize()
-            logger.info("🧹 [Stage 0.5] GPU memory cleaned after error")
-        
         raise RuntimeError(f"Stage 0.5 math validation failed: {str(e)}") from e
 
 
@@ -0,0 +1,137 @@
+"""
+LRU Expert Offloading for Mixtral MoE Layers
+
+Each token is routed to only 2 of the 8 experts per layer, so most expert weights
+sit idle in VRAM. This keeps a pinned CPU copy of every expert's weights and only
+the most recently used experts of each layer resident on the GPU:
+- Misses are copied host -> device on a side CUDA stream
+- The experts a layer routes to are prefetched into the next layer (routing in
+  consecutive layers is strongly correlated), overlapping the copy with compute
+
+Works with bitsandbytes 4-bit experts: only the packed weight data moves, the
+(small) quantization state stays on the GPU.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import List
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+class _OffloadedExpert:
+    """GPU/CPU residency of one expert MLP (w1/w2/w3)."""
+
+    def __init__(self, module: torch.nn.Module, device: torch.device):
+        self.device = device
+        self.params = list(module.parameters())
+        self.host_data = [p.data.to("cpu").pin_memory() for p in self.params]
+        self.ready = None  # CUDA event recorded after the last host -> device copy
+
+    def load(self, stream: torch.cuda.Stream):
+        # generate() runs under inference_mode, but parameter .data must stay a normal tensor
+        with torch.inference_mode(False), torch.cuda.stream(stream):
+            for param, host in zip(self.params, self.host_data):
+                param.data = host.to(self.device, non_blocking=True)
+        self.ready = torch.cuda.Event()
+        self.ready.record(stream)
+
+    def evict(self):
+        # Pointing the parameter back at the pinned host copy frees the GPU block
+        for param, host in zip(self.params, self.host_data):
+            param.data = host
+        self.ready = None
+
+    def wait(self):
+        """Make the compute stream wait for a pending copy (no-op once consumed)."""
+        if self.ready is None:
+            return
+        compute_stream = torch.cuda.current_stream()
+        compute_stream.wait_event(self.ready)
+        for param in self.params:
+            # Allocated on the copy stream but used on the compute stream
+            param.data.record_stream(compute_stream)
+        self.ready = None
+
+
+class _ExpertLRU:
+    """Keeps at most `capacity` experts of one MoE layer on the GPU."""
+
+    def __init__(self, experts: torch.nn.ModuleList, capacity: int, stream: torch.cuda.Stream, device: torch.device):
+        self.experts = [_OffloadedExpert(expert, device) for expert in experts]
+        self.capacity = capacity
+        self.stream = stream
+        self.resident = OrderedDict()
+        self.lock = threading.Lock()
+
+        for idx, expert in enumerate(self.experts):
+            if idx < capacity:
+                self.resident[idx] = True
+            else:
+                expert.evict()
+
+    def ensure(self, idx: int):
+        with self.lock:
+            if idx in self.resident:
+                self.resident.move_to_end(idx)
+                return
+            if len(self.resident) >= self.capacity:
+                evicted, _ = self.resident.popitem(last=False)
+                self.experts[evicted].evict()
+            self.experts[idx].load(self.stream)
+            self.resident[idx] = True
+
+
+def _wrap_expert_forward(expert: torch.nn.Module, lru: _ExpertLRU, idx: int):
+    original_forward = expert.forward
+
+    def forward(hidden_states: torch.Tensor) -> torch.Tensor:
+        # HF's MoE loop calls every expert, including ones no token was routed to
+        if hidden_states.shape[0] == 0:
+            return hidden_states.new_zeros(hidden_states.shape)
+        lru.ensure(idx)
+        lru.experts[idx].wait()
+        return original_forward(hidden_states)
+
+    expert.forward = forward
+
+
+def _make_prefetch_hook(next_lru: _ExpertLRU, top_k: int):
+    def hook(module, inputs, router_logits):
+        # Experts chosen here are the best guess for the next layer's routing
+        for idx in router_logits.topk(top_k, dim=-1).indices.unique().tolist()[:next_lru.capacity]:
+            next_lru.ensure(idx)
+    return hook
+
+
+def install_expert_offload(model: torch.nn.Module, resident_per_layer: int) -> int:
+    """
+    Offload Mixtral experts to pinned CPU memory, keeping `resident_per_layer`
+    experts per layer on the GPU. Returns the number of MoE layers patched.
+    """
+    moe_blocks = [layer.block_sparse_moe for layer in model.model.layers if hasattr(layer, "block_sparse_moe")]
+    if not moe_blocks:
+        logger.warning("⚠️  [Expert offload] No Mixtral MoE blocks found - skipping")
+        return 0
+
+    device = next(moe_blocks[0].experts[0].parameters()).device
+    stream = torch.cuda.Stream(device=device)
+
+    lrus: List[_ExpertLRU] = []
+    for block in moe_blocks:
+        lru = _ExpertLRU(block.experts, resident_per_layer, stream, device)
+        for idx, expert in enumerate(block.experts):
+            _wrap_expert_forward(expert, lru, idx)
+        lrus.append(lru)
+
+    for block, next_lru in zip(moe_blocks[:-1], lrus[1:]):
+        block.gate.register_forward_hook(_make_prefetch_hook(next_lru, block.top_k))
+
+    logger.info(
+        f"✅ [Expert offload] {len(moe_blocks)} MoE layers: "
+        f"{resident_per_layer}/{len(moe_blocks[0].experts)} experts resident per layer"
+    )
+    return len(moe_blocks)
@@ -1,14 +1,256 @@
 import os
+import copy
+import uuid
+import asyncio
+import bisect
+import hashlib
+# Must be set before torch initializes CUDA: the caching allocator reads this once.
+# setdefault keeps any value supplied by the Dockerfile / environment.
+# garbage_collection_threshold reclaims cached-but-unused blocks once usage passes 80%,
+# before an allocation would fail, instead of only after an OOM retry.
+os.environ.setdefault('PYTORCH_CUDA_ALLOC_CONF', 'expandable_segments:True,max_split_size_mb:512,garbage_collection_threshold:0.8')
 import json
 import logging
-from typing import Dict, Any, Optional, List
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
+import threading
+import queue
+from collections import OrderedDict
+from time import perf_counter
+from concurrent.futures import Future
+from typing import Dict, Any, Optional, List, Iterator
+from transformers import (
+    AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, GPTQConfig, DynamicCache,
+    StoppingCriteria, StoppingCriteriaList, LogitsProcessor, LogitsProcessorList
+)
 import torch
 from pydantic import BaseModel
 
-logging.basicConfig(level=logging.INFO)
+try:
+    import orjson  # C-accelerated JSON for prompt building / response parsing
+except ImportError:
+    orjson = None
+
+# Logging is configured by the entry points (app/main.py, handler.py)
 logger = logging.getLogger(__name__)
 
+# Inference backend:
+#   "transformers" -> HF model.generate() with bitsandbytes NF4 (default)
+#   "vllm"         -> vLLM AsyncLLMEngine (PagedAttention KV cache, CUDA graph decode,
+#                     continuous batching of concurrent requests).
+#                     Requires `pip install vllm`; Outlines paths are skipped.
+LLM_BACKEND = os.getenv("ZOPILOT_LLM_BACKEND", "transformers").lower()
+VLLM_MAX_MODEL_LEN = int(os.getenv("ZOPILOT_VLLM_MAX_MODEL_LEN", "32768"))
+VLLM_GPU_MEMORY_UTILIZATION = float(os.getenv("ZOPILOT_VLLM_GPU_MEMORY_UTILIZATION", "0.90"))
+VLLM_MAX_NUM_SEQS = int(os.getenv("ZOPILOT_VLLM_MAX_NUM_SEQS", "16"))
+
+# Weight quantization:
+#   "nf4"  -> bitsandbytes NF4, quantized in-flight from the FP16 checkpoint (default)
+#   "awq"  -> pre-quantized AWQ checkpoint, fused int4 GEMM kernels (pip install autoawq)
+#   "gptq" -> pre-quantized GPTQ checkpoint, ExLlamaV2 int4 kernels (pip install optimum gptqmodel)
+#   "int8" -> torchao int8 weight-only (gpt-fast recipe): plain symmetric int8 weights
+#             + per-channel scales that torch.compile fuses into the matmul. ~47GB of
+#             weights, so 48GB+ GPUs only (A40/A100/H100). Pair with ZOPILOT_TORCH_COMPILE=1.
+#   "fp8"  -> pre-quantized FP8 (E4M3) checkpoint on Ada/Hopper/Blackwell FP8 tensor cores
+#             (pip install compressed-tensors). Also ~47GB of weights - 48GB+ GPUs only.
+# AWQ/GPTQ read int4 weights straight into fused dequant-matmul kernels instead of
+# bnb's separate dequantize step, which is what dominates batch-1 decode.
+WEIGHT_QUANT = os.getenv("ZOPILOT_WEIGHT_QUANT", "nf4").lower()
+_PREQUANTIZED_MODELS = {
+    "awq": "TheBloke/Mixtral-8x7B-Instruct-v0.1-AWQ",
+    "gptq": "TheBloke/Mixtral-8x7B-Instruct-v0.1-GPTQ",
+    "fp8": "neuralmagic/Mixtral-8x7B-Instruct-v0.1-FP8",
+}
+MODEL_NAME = os.getenv("ZOPILOT_MODEL_NAME") or _PREQUANTIZED_MODELS.get(
+    WEIGHT_QUANT, "mistralai/Mixtral-8x7B-Instruct-v0.1"
+)
+
+# MoE expert offloading: keep only this many of each layer's 8 experts on the GPU
+# (LRU, pinned CPU copies for the rest; see app/expert_offload.py). Trades decode
+# speed for VRAM (~40% less at 4) - for small cards or large batches/KV. 0 = off.
+# Not compatible with ZOPILOT_TORCH_COMPILE.
+EXPERT_OFFLOAD_RESIDENT = int(os.getenv("ZOPILOT_EXPERT_OFFLOAD_RESIDENT", "0"))
+
+# Speculative (assisted) decoding: a small draft model sharing Mixtral's 32k vocab
+# proposes DRAFT_NUM_TOKENS tokens that Mixtral verifies in one forward pass.
+# Structured JSON is highly predictable, so most drafts are accepted. Empty = off.
+# e.g. ZOPILOT_DRAFT_MODEL=mistralai/Mistral-7B-Instruct-v0.2 (~4GB extra in NF4)
+DRAFT_MODEL_NAME = os.getenv("ZOPILOT_DRAFT_MODEL", "")
+DRAFT_NUM_TOKENS = int(os.getenv("ZOPILOT_DRAFT_NUM_TOKENS", "5"))
+# Dynamic drafting (transformers 4.45+): the draft stops proposing once its own
+# token probability drops below this, so uncertain spans (amounts, names) don't
+# waste a verify pass on drafts that get rejected. 0 = always draft DRAFT_NUM_TOKENS.
+DRAFT_CONFIDENCE_THRESHOLD = float(os.getenv("ZOPILOT_DRAFT_CONFIDENCE_THRESHOLD", "0.4"))
+
+# Compute dtype for activations / dequantized matmuls. BF16 has the same tensor-core
+# throughput as FP16 on Ampere+ but FP32's exponent range, so Mixtral's router
+# softmax can't overflow. Falls back to float16 on GPUs without BF16, and for
+# AWQ/GPTQ checkpoints whose int4 kernels are FP16-only.
+COMPUTE_DTYPE = os.getenv("ZOPILOT_COMPUTE_DTYPE", "bfloat16")
+
+# Attention kernel: FlashAttention-2 computes softmax(QK^T)V tile-by-tile in SRAM
+# instead of materializing the full attention matrix in HBM. Needs flash-attn and an
+# Ampere+ GPU (sm_80+); otherwise falls back to PyTorch SDPA.
+ATTN_IMPLEMENTATION = os.getenv("ZOPILOT_ATTN_IMPLEMENTATION", "flash_attention_2")
+
+def select_attn_implementation() -> str:
+    """Resolve ZOPILOT_ATTN_IMPLEMENTATION against what this GPU/image supports."""
+    if ATTN_IMPLEMENTATION != "flash_attention_2":
+        return ATTN_IMPLEMENTATION
+    
+    if not torch.cuda.is_available() or torch.cuda.get_device_capability(0)[0] < 8:
+        logger.warning("⚠️  FlashAttention-2 needs an Ampere+ GPU, using sdpa")
+        return "sdpa"
+    
+    try:
+        import flash_attn  # noqa: F401
+    except ImportError:
+        logger.warning("⚠️  flash-attn not installed, using sdpa")
+        return "sdpa"
+    
+    return "flash_attention_2"
+
+# KV cache quantization: decode re-reads the whole KV cache every step, so
+# storing it in int8/int4 roughly halves/quarters that HBM traffic.
+#   "int8" -> HQQ backend (pip install hqq)
+#   "int4" -> quanto backend (pip install optimum-quanto)
+#   "fp8"  -> vLLM backend only (kv_cache_dtype="fp8")
+#   ""     -> regular bf16/fp16 DynamicCache (default)
+KV_CACHE_QUANT = os.getenv("ZOPILOT_KV_CACHE_QUANT", "").lower()
+_KV_CACHE_BACKENDS = {
+    "int8": ("HQQ", 8),
+    "int4": ("quanto", 4),
+}
+# Only quantize the KV cache for prompts at least this long. The quantized cache
+# keeps its most recent 128 tokens unquantized anyway, and short requests are
+# better served by the regular cache (prefix KV reuse, assisted decoding).
+KV_CACHE_QUANT_MIN_TOKENS = int(os.getenv("ZOPILOT_KV_CACHE_QUANT_MIN_TOKENS", "1024"))
+
+# Journal entry output budget: fixed JSON scaffold + per line-item allowance.
+# A single debit/credit object ({"account": ..., "amount": ..., "description": ...})
+# is ~40-60 tokens, so 64/line leaves headroom for multi-leg entries.
+JOURNAL_MAX_INPUT_TOKENS = 2048
+JOURNAL_MAX_NEW_TOKENS = 1024
+JOURNAL_BASE_TOKENS = 256
+JOURNAL_TOKENS_PER_LINE = 64
+_LINE_ITEM_KEYS = ("line_items", "items", "lines", "line_item", "transactions", "entries")
+
+def _json_dumps(obj: Any) -> str:
+    """Compact JSON for prompts (no indentation - whitespace only costs input tokens)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+def request_key(context: Optional[Dict[str, Any]], user_prompt: str) -> bytes:
+    """
+    Stable digest of (context, prompt) - key order in the extracted data doesn't matter.
+    
+    Keys the journal cache here and main.py's response cache / in-flight sharing.
+    """
+    if orjson is not None:
+        context_bytes = orjson.dumps(context, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    else:
+        context_bytes = json.dumps(context, sort_keys=True, default=str).encode()
+    # SHA-256 goes through OpenSSL, which uses the CPU's SHA extensions (SHA-NI / ARMv8 SHA2)
+    return hashlib.sha256(context_bytes + b"\0" + user_prompt.encode()).digest()[:16]
+
+# raw_decode parses exactly one JSON value starting at an offset and ignores what follows
+_JSON_DECODER = json.JSONDecoder()
+
+def json_loads(text: str) -> Any:
+    """json.loads via orjson when installed (also used by app.classification)."""
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+def estimate_line_count(context: Optional[Dict[str, Any]]) -> int:
+    """Count line-item-like entries in the extracted document data (top level and one level down)."""
+    if not context:
+        return 0
+    
+    count = 0
+    for key, value in context.items():
+        if key in _LINE_ITEM_KEYS and isinstance(value, list):
+            count += len(value)
+        elif isinstance(value, dict):
+            for inner_key, inner_value in value.items():
+                if inner_key in _LINE_ITEM_KEYS and isinstance(inner_value, list):
+                    count += len(inner_value)
+    return count
+
+# torch.compile the model forward (Inductor fusion + CUDA graphs for decode).
+# Compile cost is paid during warmup at load time. Off by default because it adds
+# minutes to serverless cold starts; enable on long-lived workers.
+TORCH_COMPILE = os.getenv("ZOPILOT_TORCH_COMPILE", "0") == "1"
+TORCH_COMPILE_MODE = os.getenv("ZOPILOT_TORCH_COMPILE_MODE", "reduce-overhead")
+
+# Static KV cache: allocated once (sized to prompt + max_new_tokens) and reused by
+# every later generate() call instead of growing a DynamicCache per request. Fixed
+# shapes are what let "reduce-overhead" capture the decode step as a CUDA graph,
+# so it defaults on together with ZOPILOT_TORCH_COMPILE.
+STATIC_KV_CACHE = os.getenv("ZOPILOT_STATIC_KV_CACHE", "1" if TORCH_COMPILE else "0") == "1"
+# Fused sampling: HF applies repetition penalty, temperature, top-k, top-p and min-p
+# as separate logits processors (~20 small kernel launches per decode step). This
+# replaces them with one torch.compile'd function (see FusedSamplingProcessor).
+FUSED_SAMPLING = os.getenv("ZOPILOT_FUSED_SAMPLING", "1" if TORCH_COMPILE else "0") == "1"
+
+# Journal prompt prefix KV reuse: the instruction block is identical for every
+# request, so it is prefilled once at load and each request only prefills its own
+# document context. Skipped when a static/quantized cache is configured.
+PREFIX_CACHE = os.getenv("ZOPILOT_PREFIX_CACHE", "1") == "1"
+
+# Static part of the journal entry prompt. Kept ahead of the per-request document
+# context so its KV cache can be shared (see PREFIX_CACHE).
+JOURNAL_PROMPT_PREFIX = """<s>[INST] You are an expert accounting assistant. Your task is to generate structured journal entries in JSON format based on extracted document data.
+
+Generate a journal entry in this exact JSON structure:
+{
+  "date": "YYYY-MM-DD",
+  "description": "Clear description of the transaction",
+  "account_debits": [
+    {"account": "Account Name", "amount": 0.00, "description": "Debit description"}
+  ],
+  "account_credits": [
+    {"account": "Account Name", "amount": 0.00, "description": "Credit description"}
+  ],
+  "total_debit": 0.00,
+  "total_credit": 0.00,
+  "reference": "Document reference if available",
+  "notes": "Additional notes or observations"
+}
+
+Ensure debits equal credits and follow standard accounting principles. Only respond with valid JSON.
+"""
+
+# Micro-batching: generate_journal_entry() calls (and classification stage calls with
+# identical sampling parameters) that arrive within BATCH_WINDOW_MS of each other are
+# padded and decoded in one generate() call. Batch-1 decode is bound by reading the
+# weights, so extra sequences ride along on the same reads. ZOPILOT_BATCH_MAX_SIZE=1
+# disables batching.
+BATCH_MAX_SIZE = int(os.getenv("ZOPILOT_BATCH_MAX_SIZE", "8"))
+BATCH_WINDOW_MS = float(os.getenv("ZOPILOT_BATCH_WINDOW_MS", "10"))
+# Prompt length buckets (tokens): only prompts in the same bucket are batched, so a
+# short receipt isn't padded out to a long invoice's length for the whole prefill
+BATCH_LENGTH_BUCKETS = tuple(
+    int(n) for n in os.getenv("ZOPILOT_BATCH_LENGTH_BUCKETS", "512,1024").split(",") if n.strip()
+)
+# Stage requests batch together only if their max_new_tokens round up to the same
+# multiple of this - a 300-token request doesn't decode alongside a 3000-token one
+BATCH_MAX_NEW_TOKENS_STEP = 256
+# generate() kwargs a batch can share (hashable scalars - no schemas, processors or streamers)
+_BATCHABLE_GENERATE_KWARGS = frozenset(
+    {"do_sample", "temperature", "top_p", "top_k", "min_p", "repetition_penalty", "min_new_tokens",
+     "pad_token_id", "eos_token_id"}
+)
+# Batch group of queue items that carry a call to run on the GPU worker thread as-is
+_GPU_WORKER_CALL = object()
+
+# Memoize journal entries for identical (context, prompt) pairs - OCR reruns and
+# retries of the same document skip generation entirely. 0 disables.
+JOURNAL_CACHE_SIZE = int(os.getenv("ZOPILOT_JOURNAL_CACHE_SIZE", "256"))
+
+# Reserve peak memory at startup: one prefill of a full batch of max-length journal
+# prompts (+ output budget) so the caching allocator already holds the KV/activation
+# blocks the busiest request needs. Fails at startup instead of OOM-ing mid-traffic.
+# main.py's idle reclaim would hand those blocks back, so it defaults to off with this.
+RESERVE_PEAK_MEMORY = os.getenv("ZOPILOT_RESERVE_PEAK_MEMORY", "0") == "1"
+
 class JournalEntry(BaseModel):
     """Structured journal entry format."""
     date: str
@@ -20,13 +262,145 @@ class JournalEntry(BaseModel):
     reference: Optional[str] = None
     notes: Optional[str] = None
 
+# Grammar-constrained journal decoding: logits are masked to tokens that keep the
+# output valid against this schema, so the response always parses and no tokens
+# are spent on preamble/markdown. Needs lm-format-enforcer; without it generation
+# falls back to free-form output + _parse_journal_response.
+CONSTRAINED_JSON = os.getenv("ZOPILOT_CONSTRAINED_JSON", "1") == "1"
+JOURNAL_ENTRY_SCHEMA = JournalEntry.model_json_schema()
+
+class JsonObjectStop(StoppingCriteria):
+    """
+    Stop each sequence as soon as its first top-level JSON object closes.
+    
+    Brace depth is tracked from a per-token delta table ('{' count - '}' count of
+    every vocab entry), so no tokens are re-decoded per step. Braces inside string
+    values are counted too, which is fine for journal entry text.
+    """
+    
+    def __init__(self, brace_deltas: torch.Tensor, prompt_len: int):
+        self.brace_deltas = brace_deltas
+        self.seen_len = prompt_len
+        self.depth = None
+        self.opened = None
+        self.done = None
+    
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        if self.depth is None:
+            batch_size = input_ids.shape[0]
+            self.depth = torch.zeros(batch_size, dtype=torch.long, device=input_ids.device)
+            self.opened = torch.zeros(batch_size, dtype=torch.bool, device=input_ids.device)
+            self.done = torch.zeros(batch_size, dtype=torch.bool, device=input_ids.device)
+        
+        # Assisted decoding can accept several tokens per step - scan all new ones
+        new_tokens = input_ids[:, self.seen_len:]
+        self.seen_len = input_ids.shape[1]
+        depth = self.depth[:, None] + self.brace_deltas[new_tokens].cumsum(dim=1)
+        opened = self.opened[:, None] | (depth > 0).long().cummax(dim=1).values.bool()
+        
+        self.done |= (opened & (depth <= 0)).any(dim=1)
+        self.depth = depth[:, -1]
+        self.opened = opened[:, -1]
+        return self.done.clone()
+
+
+def _sampling_scores(input_ids: torch.LongTensor, scores: torch.FloatTensor, temperature: torch.Tensor,
+                     top_k: torch.Tensor, top_p: torch.Tensor, min_p: torch.Tensor,
+                     repetition_penalty: torch.Tensor) -> torch.FloatTensor:
+    """
+    Same math and order as HF's RepetitionPenalty -> Temperature -> TopK -> TopP -> MinP.
+    
+    The parameters are 0-d tensors and every step is applied unconditionally (a disabled
+    one is an exact no-op), so the compiled graph doesn't specialize on - and recompile
+    for - each request's temperature / top_p.
+    """
+    seen = torch.gather(scores, 1, input_ids)
+    seen = torch.where(seen < 0, seen * repetition_penalty, seen / repetition_penalty)
+    scores = scores.scatter(1, input_ids, seen) / temperature
+    
+    # One descending sort serves top-k, top-p and min-p
+    sorted_scores, sorted_indices = torch.sort(scores, descending=True)
+    vocab_size = scores.shape[-1]
+    k = torch.where(top_k > 0, top_k.clamp(max=vocab_size), vocab_size)
+    kth_best = sorted_scores.gather(1, (k - 1).expand(scores.shape[0], 1))
+    sorted_scores = sorted_scores.masked_fill(sorted_scores < kth_best, float("-inf"))
+    
+    # Top-p: drop the tail whose total probability is <= 1 - top_p, always keeping the best token
+    probs = sorted_scores.softmax(dim=-1)
+    tail_mass = probs.flip(-1).cumsum(dim=-1).flip(-1)
+    remove = tail_mass <= (1 - top_p)
+    remove[..., :1] = False
+    sorted_scores = sorted_scores.masked_fill(remove, float("-inf"))
+    
+    probs = sorted_scores.softmax(dim=-1)
+    sorted_scores = sorted_scores.masked_fill(probs < min_p * probs[..., :1], float("-inf"))
+    return torch.empty_like(scores).scatter(1, sorted_indices, sorted_scores)
+
+
+_compiled_sampling_scores = None
+
+
+class FusedSamplingProcessor(LogitsProcessor):
+    """
+    HF's sampling logits processors as one compiled function (see ZOPILOT_FUSED_SAMPLING).
+    
+    generate() still draws the token (softmax + multinomial) after this; the
+    sampling arguments it was given are reset to no-ops so nothing runs twice.
+    """
+    
+    def __init__(self, temperature: float, top_k: int, top_p: float, min_p: float, repetition_penalty: float):
+        self.params = (temperature, top_k, top_p, min_p, repetition_penalty)
+        self._param_tensors = None  # On the logits' device, built on the first step
+    
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        global _compiled_sampling_scores
+        if _compiled_sampling_scores is None:
+            try:
+                # dynamic: the prompt + generated length grows every step
+                _compiled_sampling_scores = torch.compile(_sampling_scores, dynamic=True)
+            except Exception as e:
+                logger.warning(f"⚠️  torch.compile unavailable for fused sampling, running eager: {e}")
+                _compiled_sampling_scores = _sampling_scores
+        if self._param_tensors is None:
+            temperature, top_k, top_p, min_p, repetition_penalty = self.params
+            self._param_tensors = (
+                torch.tensor(temperature, dtype=scores.dtype, device=scores.device),
+                torch.tensor(top_k, dtype=torch.long, device=scores.device),
+                torch.tensor(top_p, dtype=scores.dtype, device=scores.device),
+                torch.tensor(min_p, dtype=scores.dtype, device=scores.device),
+                torch.tensor(repetition_penalty, dtype=scores.dtype, device=scores.device),
+            )
+        return _compiled_sampling_scores(input_ids, scores, *self._param_tensors)
+
+
 class LlamaProcessor:
     def __init__(self):
         self.model = None
         self.tokenizer = None
+        self.engine = None  # vLLM AsyncLLMEngine (ZOPILOT_LLM_BACKEND=vllm)
+        self._engine_loop = None  # Event loop thread the async engine runs on
+        self._enforcer_tokenizer_data = None  # lm-format-enforcer vocab index (built lazily)
+        # LRU of parsed journal entries; per instance, so a model reload starts empty
+        self._journal_cache: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+        self._journal_cache_lock = threading.Lock()
         # Upgraded to Mixtral 8x7B for better accounting reasoning and complex logic
-        self.model_name = "mistralai/Mixtral-8x7B-Instruct-v0.1"
+        self.model_name = MODEL_NAME
+        self.dtype = self._resolve_compute_dtype()
         self._initialize_model()
+        self._install_expert_offload()
+        self.draft_model = self._load_draft_model()
+        self.cache_kwargs = self._build_cache_kwargs()
+        self._compile_model()
+        self._warmup()
+        if CONSTRAINED_JSON and self.model is not None:
+            # Index the vocab for lm-format-enforcer now rather than on the first request
+            self._json_constraint_kwargs(JOURNAL_ENTRY_SCHEMA)
+        self._prefix_ids, self._prefix_kv = self._build_prefix_cache()
+        self._brace_deltas = self._build_brace_deltas()
+        self._host_inputs, self._staging_event = self._allocate_staging_buffer()
+        self._staging_lock = threading.Lock()
+        self._batch_queue = self._start_batch_worker()
+        self._reserve_peak_memory()
     
     def _initialize_model(self):
         """Initialize Mixtral 8x7B model with GPU optimization and quantization."""
@@ -60,13 +434,15 @@ class LlamaProcessor:
             logger.info(f"Transformers version: {transformers.__version__}")
             logger.info("-"*70)
             
-            # Enable PyTorch memory expansion to reduce fragmentation
-            # Prevents "CUDA out of memory" errors during generation
-            os.environ['PYTORCH_CUDA_ALLOC_CONF'] = 'expandable_segments:True'
-            logger.info("PyTorch memory expansion enabled: expandable_segments=True")
+            # Memory expansion (expandable_segments) is configured at module import,
+            # before torch touches CUDA - setting it here would be a no-op
+            logger.info(f"PYTORCH_CUDA_ALLOC_CONF: {os.environ.get('PYTORCH_CUDA_ALLOC_CONF')}")
             
             # Clear GPU cache before loading
             if torch.cuda.is_available():
+                # TF32 for any fp32 matmuls left (router softmax, fp32 heads) - no-op for bf16/fp16 layers
+                torch.backends.cuda.matmul.allow_tf32 = True
+                torch.backends.cudnn.allow_tf32 = True
                 torch.cuda.empty_cache()
                 free_memory = torch.cuda.get_device_properties(0).total_memory - torch.cuda.memory_allocated(0)
                 logger.info(f"GPU cache cleared. Free memory: {free_memory / (1024**3):.1f} GB")
@@ -89,12 +465,7 @@ class LlamaProcessor:
             # - Leaves 12GB free for activations/KV cache/future features
             # - No OOM issues during loading
             # Quality: Excellent for classification/instruction-following tasks
-            quantization_config = BitsAndBytesConfig(
-                load_in_4bit=True,  # Use 4-bit quantization
-                bnb_4bit_compute_dtype=torch.float16,  # Compute in FP16 for quality
-                bnb_4bit_quant_type="nf4",  # NormalFloat4 (optimal for LLM weights)
-                bnb_4bit_use_double_quant=True,  # Nested quantization (saves more memory)
-            )
+            quantization_config = self._build_quantization_config()
             
             # Load tokenizer
             logger.info("Loading tokenizer...")
@@ -102,7 +473,7 @@ class LlamaProcessor:
                 self.tokenizer = AutoTokenizer.from_pretrained(
                     self.model_name,
                     token=hf_token,
-                    trust_remote_code=True
+                    use_fast=True  # Rust tokenizers - fail loudly rather than fall back to the slow one
                 )
                 
                 if self.tokenizer.pad_token is None:
@@ -115,10 +486,14 @@ class LlamaProcessor:
                 logger.error(f"Tokenizer traceback:\n{traceback.format_exc()}")
                 raise
             
+            if LLM_BACKEND == "vllm":
+                self._initialize_vllm_engine()
+                return
+            
             # Load model with quantization
             logger.info("Loading model from cache...")
             logger.info("⏱️  Cached: ~5 seconds | First download: ~15-30 minutes")
-            model_load_start = __import__('time').time()
+            model_load_start = perf_counter()
             
             # Load model with 4-bit NF4 quantization
             # Memory breakdown:
@@ -142,25 +517,45 @@ class LlamaProcessor:
             # - No max_memory constraint needed
             # - Model loads in 1-2 minutes from cache
             
-            logger.info("Loading Mixtral 8x7B with 4-bit NF4 quantization...")
+            logger.info(f"Loading Mixtral 8x7B with {WEIGHT_QUANT.upper()} weight quantization...")
             logger.info("Expected memory: ~12GB weights + ~3-5GB activations = ~16-17GB total")
             logger.info("Quality: 95-97% of FP16 (optimal for classification/instruction-following)")
             
             # Load model with simple GPU placement (no memory constraints needed!)
             # 4-bit quantization fits comfortably in available VRAM
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_name,
+            attn_implementation = select_attn_implementation()
+            logger.info(f"Attention implementation: {attn_implementation}")
+            load_kwargs = dict(
                 quantization_config=quantization_config,
                 device_map={"": 0},  # Place all layers on GPU 0
-                torch_dtype=torch.float16,
+                torch_dtype=self.dtype,  # FA2 requires fp16/bf16
                 token=hf_token,
-                trust_remote_code=True,
                 low_cpu_mem_usage=True,
-                # attn_implementation="flash_attention_2"  # 2x faster on RTX 5090! (45s → 22s)
+            )
+            try:
+                self.model = AutoModelForCausalLM.from_pretrained(
+                    self.model_name,
+                    attn_implementation=attn_implementation,
+                    **load_kwargs
+                )
+            except (ImportError, ValueError) as attn_error:
+                if attn_implementation != "flash_attention_2":
+                    raise
+                logger.warning(f"⚠️  FlashAttention-2 rejected ({attn_error}), retrying with sdpa")
+                self.model = AutoModelForCausalLM.from_pretrained(
+                    self.model_name,
+                    attn_implementation="sdpa",
+                    **load_kwargs
+                )
+            
+            # Mixtral's sliding window is passed to FA2 from the config (None = full attention)
+            logger.info(
+                f"Attention: {self.model.config._attn_implementation} "
+                f"(sliding_window={getattr(self.model.config, 'sliding_window', None)})"
             )
             
             # Report actual load time
-            model_load_time = __import__('time').time() - model_load_start
+            model_load_time = perf_counter() - model_load_start
             logger.info("-"*70)
             logger.info("MODEL LOADING SUMMARY")
             logger.info("-"*70)
@@ -348,137 +743,818 @@ class LlamaProcessor:
                 f"Original error: {error_msg}"
             )
     
+    def _initialize_vllm_engine(self):
+        """
+        Load Mixtral into a vLLM AsyncLLMEngine instead of a transformers model.
+        
+        The engine runs on its own event loop thread; generate() calls from the
+        executor threads submit to it, and its scheduler batches all in-flight
+        requests into each decode step (continuous batching).
+        """
+        from vllm import AsyncEngineArgs, AsyncLLMEngine
+        
+        logger.info("Loading Mixtral 8x7B with vLLM (PagedAttention + continuous batching)...")
+        logger.info(
+            f"   max_model_len={VLLM_MAX_MODEL_LEN}, max_num_seqs={VLLM_MAX_NUM_SEQS}, "
+            f"gpu_memory_utilization={VLLM_GPU_MEMORY_UTILIZATION}"
+        )
+        engine_load_start = perf_counter()
+        
+        # vLLM reads the HF token from the environment
+        os.environ.setdefault("HF_TOKEN", os.getenv("HUGGING_FACE_TOKEN", ""))
+        
+        engine_args = AsyncEngineArgs(
+            model=self.model_name,
+            # NF4/int8 are quantized in-flight like the HF path. For AWQ/GPTQ/FP8 checkpoints leave
+            # it unset: vLLM reads the method from config.json and upgrades to its Marlin int4
+            # kernels (awq_marlin / gptq_marlin), whereas "awq"/"gptq" force the slower ones
+            quantization={"nf4": "bitsandbytes", "int8": "experts_int8"}.get(WEIGHT_QUANT),
+            dtype=str(self.dtype).replace("torch.", ""),
+            max_model_len=VLLM_MAX_MODEL_LEN,
+            gpu_memory_utilization=VLLM_GPU_MEMORY_UTILIZATION,
+            enforce_eager=False,  # Capture CUDA graphs for decode
+            enable_prefix_caching=True,  # Reuse KV blocks of the shared prompt prefixes
+            kv_cache_dtype="fp8" if KV_CACHE_QUANT == "fp8" else "auto",  # Halves KV read bandwidth
+            speculative_config=(
+                {"model": DRAFT_MODEL_NAME, "num_speculative_tokens": DRAFT_NUM_TOKENS}
+                if DRAFT_MODEL_NAME else None
+            ),
+            max_num_seqs=VLLM_MAX_NUM_SEQS,  # Concurrent sequences per decode step
+            block_size=16,  # PagedAttention KV block size (tokens)
+        )
+        
+        async def create_engine():
+            # Constructed on the loop thread so its background tasks bind to that loop
+            return AsyncLLMEngine.from_engine_args(engine_args)
+        
+        self._engine_loop = asyncio.new_event_loop()
+        threading.Thread(target=self._engine_loop.run_forever, name="vllm-engine-loop", daemon=True).start()
+        self.engine = asyncio.run_coroutine_threadsafe(create_engine(), self._engine_loop).result()
+        logger.info(f"✅ vLLM engine loaded in {perf_counter() - engine_load_start:.1f} seconds")
+    
+    def _install_expert_offload(self):
+        """Move idle Mixtral experts to pinned CPU memory (see ZOPILOT_EXPERT_OFFLOAD_RESIDENT)."""
+        if EXPERT_OFFLOAD_RESIDENT <= 0 or self.model is None:
+            return
+        if TORCH_COMPILE:
+            logger.warning("⚠️  Expert offloading is incompatible with torch.compile - keeping all experts on GPU")
+            return
+        
+        from app.expert_offload import install_expert_offload
+        install_expert_offload(self.model, EXPERT_OFFLOAD_RESIDENT)
+        if torch.cuda.is_available():
+            allocated = torch.cuda.memory_allocated(0) / (1024**3)
+            logger.info(f"   GPU memory after expert offload: {allocated:.1f}GB allocated")
+    
+    def _resolve_compute_dtype(self) -> torch.dtype:
+        """torch dtype for ZOPILOT_COMPUTE_DTYPE, downgraded to float16 where BF16 can't run."""
+        if COMPUTE_DTYPE != "bfloat16":
+            return torch.float16
+        if WEIGHT_QUANT in ("awq", "gptq"):
+            logger.info("AWQ/GPTQ int4 kernels are FP16-only - using float16 compute")
+            return torch.float16
+        if not torch.cuda.is_available() or not torch.cuda.is_bf16_supported():
+            logger.warning("⚠️  BF16 not supported on this GPU - using float16 compute")
+            return torch.float16
+        return torch.bfloat16
+    
+    def _load_draft_model(self):
+        """Load the speculative decoding draft model (see ZOPILOT_DRAFT_MODEL)."""
+        if not DRAFT_MODEL_NAME or self.model is None:
+            # vLLM loads the draft itself via speculative_config
+            return None
+        
+        try:
+            logger.info(f"Loading draft model for assisted decoding: {DRAFT_MODEL_NAME}...")
+            draft_model = AutoModelForCausalLM.from_pretrained(
+                DRAFT_MODEL_NAME,
+                quantization_config=BitsAndBytesConfig(
+                    load_in_4bit=True,
+                    bnb_4bit_compute_dtype=self.dtype,
+                    bnb_4bit_quant_type="nf4",
+                ),
+                device_map={"": 0},
+                torch_dtype=self.dtype,
+                token=os.getenv("HUGGING_FACE_TOKEN"),
+                low_cpu_mem_usage=True,
+            )
+            if draft_model.config.vocab_size != self.model.config.vocab_size:
+                raise ValueError(
+                    f"vocab size {draft_model.config.vocab_size} != {self.model.config.vocab_size} (must share Mixtral's tokenizer)"
+                )
+            # The assisted candidate generator reads its drafting settings from the draft model's config
+            draft_model.generation_config.num_assistant_tokens = DRAFT_NUM_TOKENS
+            draft_model.generation_config.num_assistant_tokens_schedule = "constant"
+            draft_model.generation_config.assistant_confidence_threshold = DRAFT_CONFIDENCE_THRESHOLD
+            logger.info(f"✅ Draft model loaded ({DRAFT_NUM_TOKENS} speculative tokens per step)")
+            return draft_model
+        except Exception as e:
+            logger.warning(f"⚠️  Draft model unavailable, decoding without speculation: {e}")
+            return None
+    
+    def _build_quantization_config(self):
+        """Quantization config for from_pretrained (see ZOPILOT_WEIGHT_QUANT)."""
+        if WEIGHT_QUANT in ("awq", "fp8"):
+            # Pre-quantized checkpoint: transformers picks up the config from config.json
+            return None
+        if WEIGHT_QUANT == "gptq":
+            # Pre-quantized checkpoint: only select the fused int4 kernel. ExLlamaV2's
+            # kernels are markedly faster than v1 for the batch-1 decode GEMVs
+            return GPTQConfig(bits=4, use_exllama=True, exllama_config={"version": 2})
+        if WEIGHT_QUANT == "int8":
+            from transformers import TorchAoConfig
+            # Router gate stays in full precision - it's tiny and routing is precision-sensitive
+            return TorchAoConfig("int8_weight_only", modules_to_not_convert=["gate", "lm_head"])
+        
+        return BitsAndBytesConfig(
+            load_in_4bit=True,  # Use 4-bit quantization
+            bnb_4bit_compute_dtype=self.dtype,  # Dequantize to BF16/FP16 for the matmul
+            bnb_4bit_quant_type="nf4",  # NormalFloat4 (optimal for LLM weights)
+            bnb_4bit_use_double_quant=True,  # Nested quantization (saves more memory)
+        )
+    
+    @property
+    def device(self) -> torch.device:
+        """Device tokenized inputs should be moved to (CPU when vLLM owns the GPU)."""
+        if self.model is not None:
+            return self.model.device
+        return torch.device("cpu")
+    
+    def to_device(self, encoded) -> Dict[str, torch.Tensor]:
+        """
+        Move tokenizer output to self.device through pinned memory, so the H2D copy
+        is asynchronous instead of a synchronous bounce through a pageable buffer.
+        """
+        if self.device.type != "cuda":
+            return dict(encoded)
+        return {k: v.pin_memory().to(self.device, non_blocking=True) for k, v in encoded.items()}
+    
+    def _build_cache_kwargs(self) -> Dict[str, Any]:
+        """Build the KV cache arguments shared by every generate() call."""
+        if self.engine is not None:
+            return {}
+        
+        if not KV_CACHE_QUANT:
+            if STATIC_KV_CACHE:
+                logger.info("✅ Static KV cache enabled (preallocated, reused across requests)")
+                return {"cache_implementation": "static"}
+            return {}
+        
+        if STATIC_KV_CACHE:
+            logger.warning("⚠️  ZOPILOT_KV_CACHE_QUANT overrides ZOPILOT_STATIC_KV_CACHE - using quantized dynamic cache")
+        
+        if KV_CACHE_QUANT not in _KV_CACHE_BACKENDS:
+            logger.warning(f"⚠️  Unknown ZOPILOT_KV_CACHE_QUANT='{KV_CACHE_QUANT}' (expected int8/int4; fp8 is vLLM-only) - using unquantized KV cache")
+            return {}
+        
+        try:
+            from transformers import QuantizedCacheConfig
+            backend, nbits = _KV_CACHE_BACKENDS[KV_CACHE_QUANT]
+            cache_config = QuantizedCacheConfig(
+                backend=backend,
+                nbits=nbits,
+                compute_dtype=self.dtype,
+                device=str(self.model.device),
+            )
+            logger.info(
+                f"✅ KV cache quantization enabled: {KV_CACHE_QUANT} ({backend} backend) "
+                f"for prompts >= {KV_CACHE_QUANT_MIN_TOKENS} tokens"
+            )
+            return {"cache_implementation": "quantized", "cache_config": cache_config}
+        except Exception as e:
+            logger.warning(f"⚠️  KV cache quantization unavailable ({e}) - using unquantized KV cache")
+            return {}
+    
+    def generate(self, inputs: Dict[str, torch.Tensor], json_schema: Optional[Dict[str, Any]] = None,
+                 **generate_kwargs) -> torch.Tensor:
+        """
+        Run model.generate() with the processor-wide settings (KV cache config) applied.
+        
+        All generation (journal entries and classification stages) goes through here
+        so runtime optimizations only need to be wired up in one place.
+        
+        json_schema: optional JSON Schema to constrain decoding to.
+        Returns prompt + generated token ids (same layout as HF generate) for both backends.
+        """
+        if self.engine is not None:
+            return self._generate_vllm(inputs, json_schema=json_schema, **generate_kwargs)
+        
+        if json_schema is not None:
+            generate_kwargs.update(self._json_constraint_kwargs(json_schema))
+        
+        if FUSED_SAMPLING and generate_kwargs.get("do_sample"):
+            generate_kwargs = self._fused_sampling_kwargs(generate_kwargs)
+        
+        cache_kwargs = self._cache_kwargs_for(inputs["input_ids"].shape[1])
+        if cache_kwargs:
+            # A cached prefix KV is a regular DynamicCache; the prompt ids cover it anyway
+            generate_kwargs.pop("past_key_values", None)
+        
+        # Assisted decoding is batch-1 only and needs a DynamicCache (no static/quantized)
+        if self.draft_model is not None and inputs["input_ids"].shape[0] == 1 and not cache_kwargs:
+            generate_kwargs.update(assistant_model=self.draft_model, num_assistant_tokens=DRAFT_NUM_TOKENS)
+        
+        with torch.inference_mode():
+            return self.model.generate(**inputs, **cache_kwargs, **generate_kwargs)
+    
+    def _fused_sampling_kwargs(self, generate_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Move the sampling arguments into a FusedSamplingProcessor, after any other processors."""
+        processor = FusedSamplingProcessor(
+            temperature=generate_kwargs.pop("temperature", 1.0),
+            top_k=generate_kwargs.pop("top_k", None) or 0,
+            top_p=generate_kwargs.pop("top_p", 1.0),
+            min_p=generate_kwargs.pop("min_p", None) or 0.0,
+            repetition_penalty=generate_kwargs.pop("repetition_penalty", 1.0),
+        )
+        logits_processor = LogitsProcessorList(generate_kwargs.pop("logits_processor", None) or [])
+        logits_processor.append(processor)
+        # Explicit no-op values so generate() doesn't add its own (e.g. default top_k=50)
+        return {**generate_kwargs, "logits_processor": logits_processor,
+                "temperature": 1.0, "top_k": 0, "top_p": 1.0, "repetition_penalty": 1.0}
+    
+    def _cache_kwargs_for(self, prompt_len: int) -> Dict[str, Any]:
+        """self.cache_kwargs, minus KV quantization for prompts under KV_CACHE_QUANT_MIN_TOKENS."""
+        if self.cache_kwargs.get("cache_implementation") == "quantized" and prompt_len < KV_CACHE_QUANT_MIN_TOKENS:
+            return {}
+        return self.cache_kwargs
+    
+    def _json_constraint_kwargs(self, json_schema: Dict[str, Any]) -> Dict[str, Any]:
+        """HF generate() kwargs that restrict decoding to json_schema ({} if unavailable)."""
+        try:
+            from lmformatenforcer import JsonSchemaParser
+            from lmformatenforcer.integrations.transformers import (
+                build_token_enforcer_tokenizer_data,
+                build_transformers_prefix_allowed_tokens_fn,
+            )
+        except ImportError as e:
+            logger.warning(f"⚠️  lm-format-enforcer not available ({e}) - unconstrained generation")
+            return {}
+        
+        if self._enforcer_tokenizer_data is None:
+            # Indexes the 32k vocab once (~1-2s, done at load); reused by every constrained request
+            self._enforcer_tokenizer_data = build_token_enforcer_tokenizer_data(self.tokenizer)
+        
+        return {
+            "prefix_allowed_tokens_fn": build_transformers_prefix_allowed_tokens_fn(
+                self._enforcer_tokenizer_data, JsonSchemaParser(json_schema)
+            )
+        }
+    
+    def _generate_vllm(self, inputs: Dict[str, torch.Tensor], json_schema: Optional[Dict[str, Any]] = None,
+                       **generate_kwargs) -> torch.Tensor:
+        """Translate HF generate() arguments to vLLM SamplingParams and run the engine."""
+        from vllm import SamplingParams
+        from vllm.inputs import TokensPrompt
+        from vllm.sampling_params import GuidedDecodingParams
+        
+        do_sample = generate_kwargs.get("do_sample", True)
+        sampling_params = SamplingParams(
+            max_tokens=generate_kwargs.get("max_new_tokens", 1024),
+            min_tokens=generate_kwargs.get("min_new_tokens", 0),
+            temperature=generate_kwargs.get("temperature", 1.0) if do_sample else 0.0,  # 0.0 = greedy
+            top_p=generate_kwargs.get("top_p", 1.0) if do_sample else 1.0,
+            top_k=(generate_kwargs.get("top_k") or -1) if do_sample else -1,
+            min_p=generate_kwargs.get("min_p", 0.0) if do_sample else 0.0,
+            repetition_penalty=generate_kwargs.get("repetition_penalty", 1.0),
+            guided_decoding=GuidedDecodingParams(json=json_schema) if json_schema is not None else None,
+        )
+        
+        prompt_ids = inputs["input_ids"][0].tolist()
+        
+        async def run():
+            final_output = None
+            async for output in self.engine.generate(
+                TokensPrompt(prompt_token_ids=prompt_ids),
+                sampling_params,
+                request_id=uuid.uuid4().hex
+            ):
+                final_output = output
+            return final_output
+        
+        # Blocks this (executor) thread only; other requests keep joining the engine's batches
+        result = asyncio.run_coroutine_threadsafe(run(), self._engine_loop).result()
+        return torch.tensor([prompt_ids + list(result.outputs[0].token_ids)])
+    
+    def _compile_model(self):
+        """Wrap the model forward with torch.compile (see ZOPILOT_TORCH_COMPILE)."""
+        if not TORCH_COMPILE or self.model is None:
+            return
+        
+        try:
+            logger.info(f"⚙️  Compiling model forward with torch.compile(mode='{TORCH_COMPILE_MODE}')...")
+            # Compile forward (not the module): generate() resolves through the original
+            # module, so torch.compile(model) would leave the decode loop uncompiled.
+            # With a static KV cache every decode step has the same shape, so let Inductor
+            # specialize (dynamic=None only marks dims dynamic after they actually vary,
+            # i.e. prompt length) and capture the decode step as one CUDA graph.
+            # Otherwise the DynamicCache grows each step and needs dynamic=True.
+            self.model.forward = torch.compile(
+                self.model.forward,
+                mode=TORCH_COMPILE_MODE,
+                fullgraph=False,
+                dynamic=None if STATIC_KV_CACHE else True
+            )
+            # Newer transformers auto-compile the forward when a static cache is used;
+            # it is already compiled here
+            self.model.generation_config.disable_compile = True
+            logger.info("✅ Model forward compiled (graphs are built during warmup)")
+        except Exception as e:
+            logger.warning(f"⚠️  torch.compile unavailable, running eager: {e}")
+    
+    def _build_prefix_cache(self):
+        """Tokenize and prefill JOURNAL_PROMPT_PREFIX once (see ZOPILOT_PREFIX_CACHE)."""
+        prefix_ids = self.tokenizer(JOURNAL_PROMPT_PREFIX, return_tensors="pt")["input_ids"]
+        if not PREFIX_CACHE or self.model is None or self._cache_kwargs_for(0):
+            # vLLM does its own prefix caching; static/quantized caches can't be seeded
+            # (quantized only applies to long prompts, short ones still use the prefix)
+            return prefix_ids, None
+        
+        try:
+            with torch.inference_mode():
+                # Pass a DynamicCache so it comes back as one (not the legacy tuple format)
+                outputs = self.model(input_ids=prefix_ids.to(self.device), past_key_values=DynamicCache(), use_cache=True)
+            logger.info(f"✅ Journal prompt prefix cached ({prefix_ids.shape[1]} tokens)")
+            return prefix_ids, outputs.past_key_values
+        except Exception as e:
+            logger.warning(f"⚠️  Prefix cache prefill failed, prefilling full prompts: {e}")
+            return prefix_ids, None
+    
+    def _build_brace_deltas(self) -> torch.Tensor:
+        """Per-token ('{' count - '}' count) table for JsonObjectStop."""
+        pieces = self.tokenizer.convert_ids_to_tokens(list(range(len(self.tokenizer))))
+        deltas = [piece.count("{") - piece.count("}") if piece else 0 for piece in pieces]
+        return torch.tensor(deltas, dtype=torch.long, device=self.device)
+    
+    def _tokenize_journal_prompt(self, suffix: str, max_length: int = JOURNAL_MAX_INPUT_TOKENS) -> Dict[str, torch.Tensor]:
+        """Tokenize JOURNAL_PROMPT_PREFIX + suffix, reusing the cached prefix token ids."""
+        suffix_ids = self.tokenizer(
+            suffix,
+            return_tensors="pt",
+            add_special_tokens=False,
+            truncation=True,
+            max_length=max_length - self._prefix_ids.shape[1]
+        )["input_ids"]
+        input_ids = torch.cat([self._prefix_ids, suffix_ids], dim=1)
+        return {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+    
+    def _allocate_staging_buffer(self):
+        """Pinned host buffer for journal prompt ids + attention mask (None without CUDA)."""
+        if self.model is None or not torch.cuda.is_available():
+            return None, None
+        
+        # [input_ids | attention_mask] for a full batch of max-length prompts (~256KB)
+        numel = 2 * max(BATCH_MAX_SIZE, 1) * JOURNAL_MAX_INPUT_TOKENS
+        return torch.empty(numel, dtype=torch.long, pin_memory=True), torch.cuda.Event()
+    
+    def _stage_journal_inputs(self, requests: List[tuple]) -> Dict[str, torch.Tensor]:
+        """
+        Pad prompts into the pinned staging buffer and copy them to the GPU.
+        
+        Every prompt starts with the shared JOURNAL_PROMPT_PREFIX tokens, so padding
+        goes between the prefix and the suffix instead of in front: the prefix keeps
+        positions 0..P-1 in every row and its cached KV stays valid for the whole
+        batch (positions after the gap follow from the attention mask).
+        
+        Pinned memory makes the H2D copy asynchronous (pageable tensors go through a
+        synchronous bounce copy), and reusing one buffer avoids per-call allocations.
+        """
+        pad_token_id = self.tokenizer.eos_token_id
+        prefix_len = self._prefix_ids.shape[1]
+        batch_size = len(requests)
+        max_len = max(len(input_ids) for input_ids, _ in requests)
+        
+        with self._staging_lock:
+            if self._host_inputs is None:
+                host = torch.empty((2, batch_size, max_len), dtype=torch.long)
+            else:
+                # The previous async copy must finish reading the buffer before it's overwritten
+                self._staging_event.synchronize()
+                host = self._host_inputs[:2 * batch_size * max_len].view(2, batch_size, max_len)
+            
+            host[0].fill_(pad_token_id)
+            host[1].zero_()
+            host[:, :, :prefix_len] = torch.stack([self._prefix_ids[0], torch.ones_like(self._prefix_ids[0])])[:, None]
+            for row, (ids, _) in enumerate(requests):
+                suffix_len = len(ids) - prefix_len
+                host[0, row, max_len - suffix_len:] = ids[prefix_len:]
+                host[1, row, max_len - suffix_len:] = 1
+            
+            staged = host.to(self.device, non_blocking=True)
+            if self._host_inputs is not None:
+                self._staging_event.record()
+        
+        return {"input_ids": staged[0], "attention_mask": staged[1]}
+    
+    def _start_batch_worker(self) -> Optional["queue.Queue"]:
+        """
+        Start the GPU worker thread: the only thread that runs generate() once loaded.
+        
+        Concurrent generate() calls from request threads on one GPU just interleave their
+        kernels and evict each other's cache lines, so requests are queued to this thread
+        and micro-batched where possible (see ZOPILOT_BATCH_MAX_SIZE).
+        """
+        if self.model is None:
+            # vLLM schedules concurrent requests itself
+            return None
+        
+        batch_queue = queue.Queue()
+        threading.Thread(target=self._batch_worker, args=(batch_queue,), name="gpu-worker", daemon=True).start()
+        if BATCH_MAX_SIZE > 1:
+            logger.info(
+                f"✅ Micro-batching enabled (max {BATCH_MAX_SIZE}, window {BATCH_WINDOW_MS:.0f}ms, "
+                f"length buckets {BATCH_LENGTH_BUCKETS})"
+            )
+        return batch_queue
+    
+    def _run_on_gpu_worker(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the GPU worker thread and wait for its result."""
+        if self._batch_queue is None:
+            return fn(*args, **kwargs)
+        return self._submit_to_gpu_worker(fn, *args, **kwargs).result()
+    
+    def run_on_gpu_worker(self, fn, *args, **kwargs):
+        """
+        Run a callable that uses self.model (e.g. an Outlines generator) on the GPU worker
+        thread, serialized with the batched generate() calls, and return its result.
+        """
+        return self._run_on_gpu_worker(fn, *args, **kwargs)
+    
+    def _submit_to_gpu_worker(self, fn, *args, **kwargs) -> Future:
+        future = Future()
+        self._batch_queue.put((_GPU_WORKER_CALL, lambda: fn(*args, **kwargs), None, future))
+        return future
+    
+    def _batch_worker(self, batch_queue: "queue.Queue"):
+        """
+        Group queued requests by batch group (journal entries, or one set of stage
+        sampling parameters) and prompt length bucket, and generate each group together
+        once it's full or its oldest request has waited BATCH_WINDOW_MS.
+        """
+        pending = {}  # (group, bucket) -> (deadline, [(group, input_ids, max_new_tokens, future), ...])
+        while True:
+            timeout = None
+            if pending:
+                timeout = max(min(deadline for deadline, _ in pending.values()) - perf_counter(), 0)
+            try:
+                item = batch_queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is not None:
+                try:
+                    if item[0] is _GPU_WORKER_CALL:
+                        self._run_gpu_worker_call(item[1], item[3])
+                    else:
+                        key = (item[0], bisect.bisect_left(BATCH_LENGTH_BUCKETS, len(item[1])))
+                        pending.setdefault(key, (perf_counter() + BATCH_WINDOW_MS / 1000, []))[1].append(item)
+                except Exception as e:
+                    # A malformed item fails its own request - this thread must keep serving the rest
+                    item[-1].set_exception(e)
+            
+            now = perf_counter()
+            for key in [k for k, (deadline, items) in pending.items() if len(items) >= BATCH_MAX_SIZE or deadline <= now]:
+                self._run_batch(key[0], pending.pop(key)[1])
+    
+    @staticmethod
+    def _run_gpu_worker_call(call, future: Future):
+        try:
+            future.set_result(call())
+        except Exception as e:
+            future.set_exception(e)
+    
+    def _run_batch(self, group: Optional[tuple], batch: List[tuple]):
+        """Generate one batch of queued requests and resolve their futures (group None = journal entries)."""
+        try:
+            requests = [(input_ids, max_new_tokens) for _, input_ids, max_new_tokens, _ in batch]
+            if group is None:
+                results = self._generate_journal_batch(requests)
+            else:
+                results = self._generate_stage_batch(dict(group), requests)
+            for (*_, future), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            for *_, future in batch:
+                future.set_exception(e)
+    
+    def _generate_journal_tokens(self, input_ids: torch.Tensor, max_new_tokens: int) -> torch.Tensor:
+        """Generate journal entry tokens for one prompt, via the micro-batcher when enabled."""
+        if self._batch_queue is None:
+            return self._generate_journal_batch([(input_ids, max_new_tokens)])[0]
+        
+        future = Future()
+        self._batch_queue.put((None, input_ids, max_new_tokens, future))
+        return future.result()
+    
+    def generate_batched(self, inputs: Dict[str, torch.Tensor], **generate_kwargs) -> torch.Tensor:
+        """
+        generate() for a single prompt, decoded in one batch with concurrent requests that
+        use the same sampling parameters (and max_new_tokens within BATCH_MAX_NEW_TOKENS_STEP).
+        
+        Kwargs that can't be shared by a batch (json_schema, logits processors, streamers, ...)
+        get a generate() call of their own on the GPU worker thread.
+        Returns prompt + generated token ids, like generate().
+        """
+        max_new_tokens = generate_kwargs.pop("max_new_tokens", 1024)
+        if (self._batch_queue is None or inputs["input_ids"].shape[0] != 1
+                or not _BATCHABLE_GENERATE_KWARGS.issuperset(generate_kwargs)):
+            return self._run_on_gpu_worker(self.generate, inputs, max_new_tokens=max_new_tokens, **generate_kwargs)
+        
+        step = -(-max_new_tokens // BATCH_MAX_NEW_TOKENS_STEP)
+        group = tuple(sorted(generate_kwargs.items())) + (("max_new_tokens_step", step),)
+        try:
+            hash(group)  # Checked here, not on the worker - e.g. eos_token_id may be a list
+        except TypeError:
+            return self._run_on_gpu_worker(self.generate, inputs, max_new_tokens=max_new_tokens, **generate_kwargs)
+        future = Future()
+        self._batch_queue.put((group, inputs["input_ids"][0], max_new_tokens, future))
+        return torch.cat([inputs["input_ids"][0], future.result()]).unsqueeze(0)
+    
+    def _generate_journal_batch(self, requests: List[tuple], streamer=None) -> List[torch.Tensor]:
+        """
+        Generate journal entries for [(input_ids, max_new_tokens), ...] in one generate() call.
+        
+        streamer: optional HF text streamer (single request only).
+        Prompts are padded after the shared prefix so generated tokens line up. Returns the generated
+        token ids (prompt stripped) for each request, in order.
+        """
+        inputs = self._stage_journal_inputs(requests)
+        max_len = inputs["input_ids"].shape[1]
+        
+        # Seed generation with a copy of the cached prefix KV (generate() extends it in place),
+        # repeated once per row - padding sits after the prefix, so it's identical in every row
+        prefix_kwargs = {}
+        if self._prefix_kv is not None:
+            prefix_kv = copy.deepcopy(self._prefix_kv)
+            if len(requests) > 1:
+                prefix_kv.batch_repeat_interleave(len(requests))
+            prefix_kwargs["past_key_values"] = prefix_kv
+        
+        if len(requests) > 1:
+            logger.info(f"📦 Batched generation: {len(requests)} journal entries")
+        
+        outputs = self.generate(
+            inputs,
+            max_new_tokens=max(max_new_tokens for _, max_new_tokens in requests),
+            temperature=0.3,  # Lower temperature for more deterministic output
+            do_sample=True,
+            top_p=0.95,  # Slightly higher for Mixtral
+            top_k=50,  # Add top-k sampling for better quality
+            min_p=0.05,  # Drop tokens <5% as likely as the top one (trims runaway tails)
+            repetition_penalty=1.1,  # Prevent repetition
+            pad_token_id=self.tokenizer.eos_token_id,
+            eos_token_id=self.tokenizer.eos_token_id,
+            json_schema=JOURNAL_ENTRY_SCHEMA if CONSTRAINED_JSON else None,
+            # Stop once the JSON object closes instead of decoding up to max_new_tokens
+            stopping_criteria=StoppingCriteriaList([JsonObjectStop(self._brace_deltas, prompt_len=max_len)]),
+            streamer=streamer,
+            **prefix_kwargs
+        )
+        
+        return self._split_batch_outputs(outputs, max_len, requests)
+    
+    def _generate_stage_batch(self, generate_kwargs: Dict[str, Any], requests: List[tuple]) -> List[torch.Tensor]:
+        """
+        Generate [(input_ids, max_new_tokens), ...] sharing generate_kwargs in one generate() call.
+        
+        Prompts are left-padded. Returns the generated token ids (prompt stripped) for each
+        request, in order.
+        """
+        generate_kwargs.pop("max_new_tokens_step")
+        pad_token_id = generate_kwargs.get("pad_token_id", self.tokenizer.eos_token_id)
+        max_len = max(len(input_ids) for input_ids, _ in requests)
+        
+        input_ids = torch.full((len(requests), max_len), pad_token_id, dtype=torch.long, device=self.device)
+        attention_mask = torch.zeros_like(input_ids)
+        for row, (ids, _) in enumerate(requests):
+            input_ids[row, max_len - len(ids):] = ids
+            attention_mask[row, max_len - len(ids):] = 1
+        
+        if len(requests) > 1:
+            logger.info(f"📦 Batched generation: {len(requests)} stage requests")
+        
+        outputs = self.generate(
+            {"input_ids": input_ids, "attention_mask": attention_mask},
+            max_new_tokens=max(max_new_tokens for _, max_new_tokens in requests),
+            **generate_kwargs
+        )
+        return self._split_batch_outputs(outputs, max_len, requests)
+    
+    def _split_batch_outputs(self, outputs: torch.Tensor, prompt_len: int, requests: List[tuple]) -> List[torch.Tensor]:
+        """Each row's generated ids, cut at its own max_new_tokens and first eos."""
+        results = []
+        for row, (_, max_new_tokens) in enumerate(requests):
+            generated = outputs[row, prompt_len:prompt_len + max_new_tokens]
+            # Finished rows are padded with eos up to the longest sequence in the batch
+            eos_positions = (generated == self.tokenizer.eos_token_id).nonzero()
+            if len(eos_positions):
+                generated = generated[:eos_positions[0].item()]
+            results.append(generated)
+        return results
+    
+    def _warmup(self):
+        """
+        Run a tiny generation right after load so kernel selection/autotuning
+        (cuBLAS heuristics, bnb dequant kernels, attention kernels) is done
+        before the first real request instead of during it.
+        """
+        try:
+            logger.info("🔥 Warming up model (max_new_tokens=4)...")
+            warmup_start = perf_counter()
+            inputs = self.to_device(self.tokenizer("<s>[INST] Reply with {} [/INST]", return_tensors="pt"))
+            # Sample like journal entries do so the fused sampling function is compiled here too
+            sampling = (
+                {"do_sample": True, "temperature": 0.3, "top_p": 0.95, "top_k": 50, "min_p": 0.05, "repetition_penalty": 1.1}
+                if FUSED_SAMPLING else {"do_sample": False}
+            )
+            # With torch.compile, a second batch size makes Dynamo recompile with a dynamic batch
+            # dim - do that here rather than on the first concurrent burst of requests
+            batch_sizes = (1, 2) if TORCH_COMPILE and BATCH_MAX_SIZE > 1 and self.model is not None else (1,)
+            for batch_size in batch_sizes:
+                self.generate(
+                    {k: v.repeat(batch_size, 1) for k, v in inputs.items()},
+                    max_new_tokens=4,
+                    **sampling,
+                    pad_token_id=self.tokenizer.eos_token_id,
+                    eos_token_id=self.tokenizer.eos_token_id
+                )
+            logger.info(f"✅ Warmup complete in {perf_counter() - warmup_start:.1f}s")
+        except Exception as e:
+            # Warmup is an optimization only - never fail model init because of it
+            logger.warning(f"⚠️  Warmup generation failed (continuing): {e}")
+    
+    def _reserve_peak_memory(self):
+        """Prefill a worst-case journal batch once (see ZOPILOT_RESERVE_PEAK_MEMORY)."""
+        if not RESERVE_PEAK_MEMORY or self.model is None or not torch.cuda.is_available():
+            return
+        
+        batch_size = max(BATCH_MAX_SIZE, 1)
+        seq_len = JOURNAL_MAX_INPUT_TOKENS + JOURNAL_MAX_NEW_TOKENS
+        try:
+            logger.info(f"📐 Reserving peak memory ({batch_size} x {seq_len} tokens)...")
+            input_ids = torch.full((batch_size, seq_len), self.tokenizer.eos_token_id, dtype=torch.long, device=self.device)
+            self.generate(
+                {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)},
+                max_new_tokens=1,
+                do_sample=False,
+                pad_token_id=self.tokenizer.eos_token_id,
+            )
+            reserved = torch.cuda.memory_reserved(0) / (1024**3)
+            logger.info(f"✅ Peak memory reserved: {reserved:.1f}GB held by the caching allocator")
+        except torch.cuda.OutOfMemoryError:
+            torch.cuda.empty_cache()
+            logger.warning(
+                f"⚠️  Worst-case batch ({batch_size} x {seq_len} tokens) does not fit - "
+                f"lower ZOPILOT_BATCH_MAX_SIZE"
+            )
+        except Exception as e:
+            # Reservation is an optimization only - never fail model init because of it
+            logger.warning(f"⚠️  Peak memory reservation failed (continuing): {e}")
+    
     def generate_journal_entry(self, prompt: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """Generate a structured journal entry in JSON format."""
-        if not self.model or not self.tokenizer:
+        if (self.model is None and self.engine is None) or not self.tokenizer:
             raise RuntimeError("Model not initialized")
         
+        cache_key = request_key(context, prompt) if JOURNAL_CACHE_SIZE > 0 else None
+        if cache_key is not None:
+            with self._journal_cache_lock:
+                cached = self._journal_cache.get(cache_key)
+                if cached is not None:
+                    self._journal_cache.move_to_end(cache_key)
+            if cached is not None:
+                logger.info("♻️  Journal entry served from cache (identical context + prompt)")
+                return copy.deepcopy(cached)
+        
         try:
-            logger.info("🎯 Starting generation...")
-            gen_start = __import__('time').time()
+            gen_start = perf_counter()
             
             # Build the system prompt for structured JSON output
-            system_message = self._build_system_prompt(context, prompt)
-            logger.info(f"📝 Prompt built: {len(system_message)} chars")
-            
-            # Format for Mixtral-Instruct (uses [INST] tags)
-            formatted_prompt = f"<s>[INST] {system_message}\n\nGenerate the journal entry in the specified JSON format. [/INST]"
+            prompt_suffix = self._build_system_prompt(context, prompt)
             
             # Tokenize and generate
-            logger.info("🔢 Tokenizing input...")
-            inputs = self.tokenizer(formatted_prompt, return_tensors="pt", truncation=True, max_length=2048)
-            inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
+            inputs = self._tokenize_journal_prompt(prompt_suffix)
             input_tokens = len(inputs["input_ids"][0])
-            logger.info(f"   Input tokens: {input_tokens}")
-            
-            logger.info("🚀 Generating response (max 1024 tokens)...")
-            gen_only_start = __import__('time').time()
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    **inputs,
-                    max_new_tokens=1024,  # Increased for complex accounting entries
-                    temperature=0.3,  # Lower temperature for more deterministic output
-                    do_sample=True,
-                    top_p=0.95,  # Slightly higher for Mixtral
-                    top_k=50,  # Add top-k sampling for better quality
-                    repetition_penalty=1.1,  # Prevent repetition
-                    pad_token_id=self.tokenizer.eos_token_id,
-                    eos_token_id=self.tokenizer.eos_token_id
+            
+            # Bound output length by document size - a simple receipt needs ~150 tokens,
+            # so generating up to 1024 for every request wastes decode steps
+            line_count = estimate_line_count(context)
+            max_new_tokens = min(JOURNAL_MAX_NEW_TOKENS, JOURNAL_BASE_TOKENS + JOURNAL_TOKENS_PER_LINE * line_count)
+            
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    f"📝 Prompt: {len(prompt_suffix)} chars (+ {len(JOURNAL_PROMPT_PREFIX)} char shared prefix), "
+                    f"{input_tokens} tokens, max {max_new_tokens} new tokens for {line_count} line items"
                 )
-            gen_time = __import__('time').time() - gen_only_start
-            output_tokens = len(outputs[0]) - input_tokens
-            tokens_per_sec = output_tokens / gen_time if gen_time > 0 else 0
-            logger.info(f"✅ Generated {output_tokens} tokens in {gen_time:.1f}s ({tokens_per_sec:.1f} tok/s)")
-            
-            # Decode response
-            logger.info("📖 Decoding response...")
-            response = self.tokenizer.decode(outputs[0][len(inputs["input_ids"][0]):], skip_special_tokens=True)
-            logger.info(f"   Response length: {len(response)} chars")
-            
-            # CRITICAL: Clear KV cache after generation to prevent memory leak
-            # KV cache can grow to 4-8GB and stays in VRAM if not cleared
-            if hasattr(self.model, 'past_key_values'):
-                self.model.past_key_values = None
-            torch.cuda.empty_cache()
-            torch.cuda.synchronize()  # Ensure cleanup completes before continuing
             
-            # Report memory after cleanup
-            if torch.cuda.is_available():
-                allocated = torch.cuda.memory_allocated(0) / (1024**3)
-                reserved = torch.cuda.memory_reserved(0) / (1024**3)
-                logger.info(f"🧹 KV cache cleared: {allocated:.2f}GB allocated, {reserved:.2f}GB reserved")
+            gen_only_start = perf_counter()
+            generated = self._generate_journal_tokens(inputs["input_ids"][0], max_new_tokens)
+            gen_time = perf_counter() - gen_only_start
             
-            # Parse JSON from response
-            logger.info("🔍 Parsing JSON response...")
+            # Decode and parse response
+            response = self.tokenizer.decode(generated, skip_special_tokens=True)
             result = self._parse_journal_response(response)
             
-            total_time = __import__('time').time() - gen_start
-            logger.info(f"🎉 Generation complete in {total_time:.1f}s total")
+            # Don't memoize _fallback_journal_entry() results - a retry should regenerate
+            if cache_key is not None and result.get("reference") != "System Generated":
+                with self._journal_cache_lock:
+                    self._journal_cache[cache_key] = copy.deepcopy(result)
+                    if len(self._journal_cache) > JOURNAL_CACHE_SIZE:
+                        self._journal_cache.popitem(last=False)
+            
+            # One summary line per request (timings, + memory at DEBUG) instead of per-step logging
+            if logger.isEnabledFor(logging.INFO):
+                output_tokens = len(generated)
+                tokens_per_sec = output_tokens / gen_time if gen_time > 0 else 0
+                memory_str = ""
+                if torch.cuda.is_available() and logger.isEnabledFor(logging.DEBUG):
+                    allocated = torch.cuda.memory_allocated(0) / (1024**3)
+                    reserved = torch.cuda.memory_reserved(0) / (1024**3)
+                    memory_str = f" | 💾 {allocated:.2f}GB allocated, {reserved:.2f}GB reserved"
+                logger.info(
+                    f"🎉 Journal entry: {input_tokens} in / {output_tokens} out tokens, "
+                    f"generate {gen_time:.1f}s ({tokens_per_sec:.1f} tok/s), "
+                    f"total {perf_counter() - gen_start:.1f}s{memory_str}"
+                )
             return result
             
+        except torch.cuda.OutOfMemoryError:
+            # Surfaced as-is so the API answers 507 and compacts the allocator
+            logger.error("❌ Generation failed: CUDA out of memory")
+            raise
+            
         except Exception as e:
             import traceback
             logger.error(f"❌ Generation failed: {str(e)}")
             logger.error(f"🔍 Traceback:\n{traceback.format_exc()}")
             
-            # CRITICAL: Clean up KV cache even on error to prevent memory leaks
-            if hasattr(self.model, 'past_key_values'):
-                self.model.past_key_values = None
-            torch.cuda.empty_cache()
-            logger.info("🧹 KV cache cleared after error")
-            
             # CRITICAL: Don't return fallback - raise exception so backend knows generation failed
             # Returning fallback causes silent failures where backend gets empty/incorrect data
             raise RuntimeError(f"Mixtral generation failed: {str(e)}") from e
     
+    def stream_journal_entry(self, prompt: str, context: Dict[str, Any] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Generate a journal entry, yielding {"delta": text} as tokens are decoded and
+        finally {"entry": {...}} once the JSON object has closed and been parsed.
+        
+        Runs its own generate() call on the GPU worker (a streamer is batch-1 only, so this
+        bypasses micro-batching). The vLLM backend yields only the final entry.
+        """
+        if self.engine is not None:
+            yield {"entry": self.generate_journal_entry(prompt, context)}
+            return
+        if self.model is None or not self.tokenizer:
+            raise RuntimeError("Model not initialized")
+        
+        from transformers import TextIteratorStreamer
+        
+        inputs = self._tokenize_journal_prompt(self._build_system_prompt(context, prompt))
+        # Same output budget as generate_journal_entry()
+        max_new_tokens = min(JOURNAL_MAX_NEW_TOKENS, JOURNAL_BASE_TOKENS + JOURNAL_TOKENS_PER_LINE * estimate_line_count(context))
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        
+        def run():
+            try:
+                return self._generate_journal_batch([(inputs["input_ids"][0], max_new_tokens)], streamer=streamer)[0]
+            except Exception:
+                streamer.end()  # Unblock the consumer below
+                raise
+        
+        result = self._submit_to_gpu_worker(run)
+        for text in streamer:
+            if text:
+                yield {"delta": text}
+        
+        generated = result.result()
+        yield {"entry": self._parse_journal_response(self.tokenizer.decode(generated, skip_special_tokens=True))}
+    
     def _build_system_prompt(self, context: Optional[Dict[str, Any]], user_prompt: str) -> str:
-        """Build system prompt for structured journal entry generation."""
+        """Build the per-request part of the journal prompt (follows JOURNAL_PROMPT_PREFIX)."""
         context_str = ""
         if context:
-            context_str = f"\nExtracted Document Data:\n{json.dumps(context, indent=2)}\n"
+            context_str = f"\nExtracted Document Data:\n{_json_dumps(context)}\n"
         
-        return f"""You are an expert accounting assistant. Your task is to generate structured journal entries in JSON format based on extracted document data.
-{context_str}
+        return f"""{context_str}
 User Request: {user_prompt}
 
-Generate a journal entry in this exact JSON structure:
-{{
-  "date": "YYYY-MM-DD",
-  "description": "Clear description of the transaction",
-  "account_debits": [
-    {{"account": "Account Name", "amount": 0.00, "description": "Debit description"}}
-  ],
-  "account_credits": [
-    {{"account": "Account Name", "amount": 0.00, "description": "Credit description"}}
-  ],
-  "total_debit": 0.00,
-  "total_credit": 0.00,
-  "reference": "Document reference if available",
-  "notes": "Additional notes or observations"
-}}
-
-Ensure debits equal credits and follow standard accounting principles. Only respond with valid JSON."""
+Generate the journal entry in the specified JSON format. [/INST]"""
     
     def _parse_journal_response(self, response: str) -> Dict[str, Any]:
         """Parse JSON from model response with fallback handling."""
         try:
-            # Find JSON content
+            # Constrained decoding emits exactly one schema-valid JSON object
+            return JournalEntry.model_validate_json(response).model_dump()
+        except Exception:
+            pass  # Unconstrained output (preamble/markdown) - extract the JSON below
+        
+        try:
+            # Parse the first JSON object after any preamble in one pass; trailing
+            # text (markdown fences, commentary) is ignored rather than scanned for '}'
             start = response.find('{')
-            end = response.rfind('}') + 1
-            
-            if start == -1 or end == 0:
+            if start == -1:
                 raise ValueError("No JSON found in response")
             
-            json_str = response[start:end]
-            parsed = json.loads(json_str)
-            
-            # Validate structure
-            required_fields = ['date', 'description', 'account_debits', 'account_credits', 'total_debit', 'total_credit']
-            for field in required_fields:
-                if field not in parsed:
-                    raise ValueError(f"Missing required field: {field}")
-            
-            return parsed
+            parsed, _ = _JSON_DECODER.raw_decode(response, start)
+            # Same validation as the constrained path (missing fields / wrong types raise)
+            return JournalEntry.model_validate(parsed).model_dump()
             
         except Exception as e:
             logger.warning(f"Failed to parse JSON response: {str(e)}")
@@ -496,19 +1572,38 @@ Ensure debits equal credits and follow standard accounting principles. Only resp
             "total_debit": 0.00,
             "total_credit": 0.00,
             "reference": "System Generated",
-            "notes": f"Processing error: {error_msg}. Original context: {json.dumps(context) if context else 'None'}"
+            "notes": f"Processing error: {error_msg}. Original context: {_json_dumps(context) if context else 'None'}"
         }
 
 # Global instance
 _llama_processor = None
+# Guards first construction: two concurrent cold-start requests must not both
+# load Mixtral (briefly doubles VRAM and OOMs a 24GB card)
+_init_lock = threading.Lock()
 
 def get_llama_processor() -> LlamaProcessor:
-    """Get or create global Llama processor instance."""
+    """Get or create global Llama processor instance (thread-safe)."""
     global _llama_processor
     if _llama_processor is None:
-        _llama_processor = LlamaProcessor()
+        with _init_lock:
+            # Double-checked: another thread may have finished loading while we waited
+            if _llama_processor is None:
+                _llama_processor = LlamaProcessor()
     return _llama_processor
 
+def is_llama_processor_loaded() -> bool:
+    """Whether the processor exists, without triggering (or waiting on) a load."""
+    return _llama_processor is not None
+
+# Eager load at import so the first request doesn't pay the model load cost
+# (5s cached / 15-30 min cold) and time out. Set ZOPILOT_EAGER_LOAD=0 to defer
+# loading to the first get_llama_processor() call (e.g. for tooling/scripts).
+if os.getenv("ZOPILOT_EAGER_LOAD", "1") == "1":
+    try:
+        get_llama_processor()
+    except Exception as e:
+        logger.error(f"❌ Eager model load failed, will retry on first request: {e}")
+
 def generate_with_llama(prompt: str, context: Dict[str, Any] = None, generation_config: Dict[str, Any] = None) -> Dict[str, Any]:
     """
     Generate structured journal entry using Mixtral 8x7B Instruct.
@@ -1,25 +1,49 @@
 import os
+import gc
+import hmac
+import copy
+import json
 import logging
 import asyncio
+import time
+from datetime import datetime
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from typing import Dict, Any, Optional
 from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, status, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+try:
+    import orjson  # noqa: F401 - ORJSONResponse needs it at response time
+    from fastapi.responses import ORJSONResponse as FastJSONResponse  # Serializes straight to bytes, 3-10x faster
+except ImportError:
+    FastJSONResponse = JSONResponse
+from pydantic import BaseModel, Field, field_validator
 import aiofiles
 from pathlib import Path
 import torch  # For CUDA OOM error handling
 
-from app.llama_utils import generate_with_llama, get_llama_processor
-
-# Configure logging
+# Configure logging before importing app modules (llama_utils loads the model at import)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+from app.llama_utils import (
+    generate_with_llama, get_llama_processor, is_llama_processor_loaded, request_key,
+    BATCH_MAX_SIZE, LLM_BACKEND, VLLM_MAX_NUM_SEQS, RESERVE_PEAK_MEMORY
+)
+from app.classification import (
+    classify_stage0_5_math, classify_stage1, classify_stage2_5_entity_extraction, classify_stage2
+)
+
+# Model reported in response metadata
+RESPONSE_MODEL_NAME = "mistralai/Mixtral-8x7B-Instruct-v0.1"
+
 # Pydantic models
 
 class PromptInput(BaseModel):
@@ -34,21 +58,22 @@ class PromptInput(BaseModel):
     repetition_penalty: Optional[float] = Field(1.1, description="Repetition penalty (1.0 = no penalty)")
     
     # Token limits for input
-    max_input_length: Optional[int] = Field(None, description="Max input tokens (default: 90% of 32k = 29491)")
+    max_input_length: int = Field(29491, description="Max input tokens (default: 90% of 32k = 29491)")
     
-    class Config:
-        # Pydantic v1 config
-        validate_assignment = True
-        
-    def __init__(self, **data):
-        super().__init__(**data)
-        # Set default for max_input_length if not provided
-        if self.max_input_length is None:
-            self.max_input_length = 29491  # 90% of 32768 (reserve 10% for generation)
+    # Journal entries only: respond with Server-Sent Events as tokens are generated
+    stream: bool = Field(False, description="Stream the journal entry as Server-Sent Events (same as /prompt/stream)")
+    
+    @field_validator("max_input_length", mode="before")
+    @classmethod
+    def _default_max_input_length(cls, value: Any) -> Any:
+        # Clients may still send an explicit null (accepted before the field had a default):
+        # it gets the default too - 90% of 32768 (reserve 10% for generation). A Python
+        # callback, but a single check, run before the int validation in pydantic-core
+        return 29491 if value is None else value
     
 class PromptResponse(BaseModel):
     success: bool
-    output: str
+    output: Any  # Parsed dict for structured stages, str otherwise
     metadata: Dict[str, Any]
 
 class HealthResponse(BaseModel):
@@ -56,10 +81,98 @@ class HealthResponse(BaseModel):
     models_loaded: Dict[str, bool]
     gpu_available: bool
     memory_info: Optional[Dict[str, Any]] = None
+    generations: Optional[Dict[str, int]] = None  # {"inflight": n, "max": MAX_INFLIGHT_GENERATIONS}
+
+# Retry prevention: a request identical to one still generating (client retry after
+# a timeout, duplicate webhook) awaits that generation instead of running its own
+_inflight_outputs: Dict[bytes, asyncio.Future] = {}  # {request key: future output}
+
+# Admission control: at most this many distinct generations queued or running; beyond
+# it /prompt answers 503 + Retry-After right away instead of queueing work that would
+# time out (and be retried) or push the GPU into OOM. Cache hits and requests joining
+# an in-flight generation are always admitted. 0 disables.
+MAX_INFLIGHT_GENERATIONS = int(os.getenv("ZOPILOT_MAX_INFLIGHT_GENERATIONS", "32"))
+BUSY_RETRY_AFTER_SECONDS = 2
+_inflight_streams = 0  # Streamed generations (never shared, so not in _inflight_outputs)
 
-# Retry prevention: Track recent extraction requests to avoid duplicate processing
-recent_extractions = {}  # {document_id: timestamp}
-EXTRACTION_DEDUP_WINDOW = 60  # seconds
+def _inflight_generations() -> int:
+    """Distinct generations queued or running (what MAX_INFLIGHT_GENERATIONS caps)."""
+    return len(_inflight_outputs) + _inflight_streams
+
+def _check_capacity(stage: str):
+    """503 + Retry-After if MAX_INFLIGHT_GENERATIONS generations are already in flight."""
+    inflight = _inflight_generations()
+    if 0 < MAX_INFLIGHT_GENERATIONS <= inflight:
+        logger.warning(f"[PROMPT] 🚦 {inflight} generations in flight - shedding {stage} request")
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy. Retry shortly.",
+            headers={"Retry-After": str(BUSY_RETRY_AFTER_SECONDS)}
+        )
+
+# Exact-match /prompt response cache (all stages): a retried or re-submitted request
+# with the same stage, prompt, context and generation parameters is answered from
+# memory. Semantic (embedding) matching is deliberately not used - two invoices that
+# differ only in amounts or dates read as near-identical but need different output.
+PROMPT_CACHE_SIZE = int(os.getenv("ZOPILOT_PROMPT_CACHE_SIZE", "512"))
+_prompt_cache: "OrderedDict[bytes, Any]" = OrderedDict()
+
+# Dedicated, bounded pool for /prompt generation instead of the default executor
+# (shared with everything else, up to cpu_count + 4 threads). These threads only
+# tokenize, decode and parse - generate() itself runs on llama_utils' GPU worker -
+# and block while the micro-batcher groups their requests, so it needs about one
+# thread per batch slot; more would only queue extra GPU work behind the same model.
+# With vLLM each thread holds one engine request, so the pool must cover max_num_seqs
+# or it caps the continuous batch below what the engine can schedule.
+PROMPT_WORKERS = int(os.getenv(
+    "ZOPILOT_PROMPT_WORKERS", str(VLLM_MAX_NUM_SEQS if LLM_BACKEND == "vllm" else max(BATCH_MAX_SIZE, 2))
+))
+PROMPT_EXECUTOR = ThreadPoolExecutor(max_workers=PROMPT_WORKERS, thread_name_prefix="prompt")
+
+# GPU memory policy: requests never call empty_cache()/synchronize() themselves - the
+# KV cache is freed with generate()'s locals and the caching allocator keeps those
+# blocks reserved, so back-to-back requests reuse them without cudaMalloc. Memory goes
+# back to the driver only here, off the request path: right after a CUDA OOM, or once
+# no /prompt request has run for GPU_RECLAIM_IDLE_SECONDS and cached-but-unused memory
+# exceeds GPU_RECLAIM_THRESHOLD_GB. 0 seconds disables the idle reclaim - the default
+# with ZOPILOT_RESERVE_PEAK_MEMORY=1, whose reserved blocks this would release.
+GPU_RECLAIM_IDLE_SECONDS = float(os.getenv("ZOPILOT_GPU_RECLAIM_IDLE_SECONDS", "0" if RESERVE_PEAK_MEMORY else "30"))
+GPU_RECLAIM_THRESHOLD_GB = float(os.getenv("ZOPILOT_GPU_RECLAIM_THRESHOLD_GB", "2"))
+_inflight_prompts = 0
+_reclaim_handle: Optional[asyncio.TimerHandle] = None
+# Set by a CUDA OOM: the next reclaim runs right away, regardless of load or threshold
+_gpu_compaction_requested = False
+
+def _schedule_gpu_reclaim():
+    """(Re)start the idle timer after a request finishes."""
+    global _reclaim_handle
+    if not torch.cuda.is_available() or (GPU_RECLAIM_IDLE_SECONDS <= 0 and not _gpu_compaction_requested):
+        return
+    if _reclaim_handle is not None:
+        _reclaim_handle.cancel()
+    delay = 0 if _gpu_compaction_requested else GPU_RECLAIM_IDLE_SECONDS
+    _reclaim_handle = asyncio.get_running_loop().call_later(delay, _maybe_empty_cache)
+
+def _maybe_empty_cache():
+    """Release cached GPU blocks if the service is idle and enough memory is held (or after an OOM)."""
+    global _gpu_compaction_requested
+    if _gpu_compaction_requested:
+        _gpu_compaction_requested = False
+        reason = "after CUDA OOM"
+    elif _inflight_prompts:
+        return
+    elif torch.cuda.memory_reserved(0) - torch.cuda.memory_allocated(0) > GPU_RECLAIM_THRESHOLD_GB * (1024**3):
+        reason = "idle"
+    else:
+        return
+    # empty_cache() synchronizes the device - keep it off the event loop
+    asyncio.get_running_loop().run_in_executor(None, _release_cached_gpu_memory, reason)
+
+def _release_cached_gpu_memory(reason: str):
+    idle_bytes = torch.cuda.memory_reserved(0) - torch.cuda.memory_allocated(0)
+    gc.collect()
+    torch.cuda.empty_cache()
+    logger.info(f"🧹 Released {idle_bytes / (1024**3):.1f}GB of cached GPU memory ({reason})")
 
 # Application lifespan management
 @asynccontextmanager
@@ -77,6 +190,7 @@ async def lifespan(app: FastAPI):
         raise
     finally:
         logger.info("Shutting down EasyAccountsGPU Service...")
+        PROMPT_EXECUTOR.shutdown(wait=False, cancel_futures=True)
 
 async def initialize_models():
     """Initialize models in background."""
@@ -90,7 +204,7 @@ async def initialize_models():
     
     
     # Initialize in background
-    loop = asyncio.get_event_loop()
+    loop = asyncio.get_running_loop()
     await asyncio.gather(
         loop.run_in_executor(None, init_llama),
         return_exceptions=True
@@ -101,7 +215,8 @@ app = FastAPI(
     title="ZopilotGPU API",
     description="LLM prompting with Mixtral 8x7B on RTX 5090",
     version="2.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # Security: Get allowed origins from environment
@@ -125,6 +240,7 @@ app.add_middleware(
 
 # API Key Authentication
 API_KEY = os.getenv("ZOPILOT_GPU_API_KEY")
+_API_KEY_BYTES = API_KEY.encode() if API_KEY else None  # Encoded once for compare_digest
 if API_KEY:
     logger.info("API key authentication enabled")
 else:
@@ -132,24 +248,23 @@ else:
 
 async def verify_api_key(request: Request):
     """Verify API key from request headers."""
-    if not API_KEY:
+    if _API_KEY_BYTES is None:
         return True  # No auth required if API_KEY not set
     
-    auth_header = request.headers.get("Authorization")
-    api_key_header = request.headers.get("X-API-Key")
-    
     # Support both Authorization: Bearer <key> and X-API-Key: <key>
+    auth_header = request.headers.get("Authorization")
     if auth_header and auth_header.startswith("Bearer "):
         provided_key = auth_header[7:]
-    elif api_key_header:
-        provided_key = api_key_header
     else:
+        provided_key = request.headers.get("X-API-Key")
+    if not provided_key:
         raise HTTPException(
             status_code=401,
             detail="Missing API key. Provide via 'Authorization: Bearer <key>' or 'X-API-Key: <key>'"
         )
     
-    if provided_key != API_KEY:
+    # Constant-time compare - `!=` returns at the first differing byte
+    if not hmac.compare_digest(provided_key.encode(), _API_KEY_BYTES):
         raise HTTPException(status_code=403, detail="Invalid API key")
     
     return True
@@ -163,6 +278,16 @@ async def global_exception_handler(request, exc):
         content={"error": "Internal server error", "detail": str(exc)}
     )
 
+# Health probes arrive every few seconds from RunPod / load balancers; one snapshot
+# answers all of them for HEALTH_CACHE_SECONDS
+HEALTH_CACHE_SECONDS = 2.0
+_health_cache = [0.0, None]  # [monotonic time, HealthResponse]
+
+@lru_cache(maxsize=1)
+def _gpu_total_memory() -> int:
+    """Device 0 total memory (fixed for the process lifetime)."""
+    return torch.cuda.get_device_properties(0).total_memory
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check(request: Request):
     """Health check endpoint for RunPod monitoring."""
@@ -170,14 +295,16 @@ async def health_check(request: Request):
     skip_auth = os.getenv("HEALTH_CHECK_PUBLIC", "true").lower() == "true"
     if not skip_auth:
         await verify_api_key(request)
+    now = time.monotonic()
+    if _health_cache[1] is not None and now - _health_cache[0] < HEALTH_CACHE_SECONDS:
+        return _health_cache[1]
     try:
-        import torch
         gpu_available = torch.cuda.is_available()
         
         memory_info = None
         if gpu_available:
             memory_info = {
-                "total": torch.cuda.get_device_properties(0).total_memory,
+                "total": _gpu_total_memory(),
                 "allocated": torch.cuda.memory_allocated(0),
                 "cached": torch.cuda.memory_reserved(0)
             }
@@ -188,20 +315,21 @@ async def health_check(request: Request):
             "docstrange": False
         }
         
-        try:
-            get_llama_processor()
-            models_loaded["llama"] = True
-        except:
-            pass
+        # Only check the singleton - calling get_llama_processor() here would load the
+        # model on the event loop (or block behind the loading thread) during startup
+        models_loaded["llama"] = is_llama_processor_loaded()
         
         # Docstrange removed - LLM-only endpoint
         models_loaded["docstrange"] = False
-        return HealthResponse(
+        health = HealthResponse(
             status="healthy",
             models_loaded=models_loaded,
             gpu_available=gpu_available,
-            memory_info=memory_info
+            memory_info=memory_info,
+            generations={"inflight": _inflight_generations(), "max": MAX_INFLIGHT_GENERATIONS}
         )
+        _health_cache[:] = [now, health]
+        return health
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Health check failed: {str(e)}")
@@ -217,9 +345,6 @@ async def warmup_endpoint(request: Request):
     await verify_api_key(request)
     
     try:
-        import time
-        from pathlib import Path
-        
         logger.info("🔥 Warmup requested - pre-caching models...")
         start_time = time.time()
         results = {}
@@ -265,10 +390,57 @@ async def warmup_endpoint(request: Request):
         logger.error(f"❌ Warmup failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Warmup failed: {str(e)}")
 
+# No tokenizer averages more than this many characters per token on real text, so a
+# prompt longer than max_input_length * this can't fit - reject it before it queues
+MAX_CHARS_PER_TOKEN = 6
+
+def _check_prompt_size(data: PromptInput):
+    """413 for prompts that certainly exceed max_input_length (no tokenization needed)."""
+    if len(data.prompt) > data.max_input_length * MAX_CHARS_PER_TOKEN:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Prompt ({len(data.prompt)} chars) exceeds max_input_length ({data.max_input_length} tokens)"
+        )
+
+# context.stage -> stage function; any other stage is a legacy journal entry (generate_with_llama)
+_STAGE_FUNCTIONS = {
+    'math_validation': classify_stage0_5_math,                  # Stage 0.5: Math Validation (LLM-Powered)
+    'action_selection': classify_stage1,                        # Stage 1: Semantic Analysis + Action Selection
+    'entity_extraction': classify_stage2_5_entity_extraction,   # Stage 2.5: Entity Field Extraction (LLM-Powered)
+    'field_mapping': classify_stage2,                           # Stage 4: Field Mapping (single action)
+    'field_mapping_batch': classify_stage2,                     # Stage 4: Field Mapping (batch)
+}
+
+def _describe_stage(stage: str, context: Optional[Dict[str, Any]]) -> str:
+    """Log label for a stage request."""
+    context = context or {}
+    if stage == 'math_validation':
+        return "🧮 Stage 0.5: Math Validation"
+    if stage == 'action_selection':
+        return "🔍 Stage 1: Action Selection"
+    if stage == 'entity_extraction':
+        entity_types = context.get('entity_types', [])
+        return f"🔍 Stage 2.5: Entity Field Extraction for {len(entity_types)} entity types: {entity_types}"
+    if stage == 'field_mapping_batch':
+        return f"🗺️  Stage 4: Batch Field Mapping for {context.get('action_count', 'unknown')} actions: {context.get('actions', [])}"
+    if stage == 'field_mapping':
+        return f"🗺️  Stage 4: Field Mapping for {context.get('action', 'unknown')}"
+    return "📝 Legacy: Journal Entry Generation"
+
+async def _run_prompt_stage(stage: str, data: PromptInput, generation_config: Dict[str, Any]) -> Any:
+    """Run the classification stage / journal generation selected by context.stage."""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(f"[PROMPT] {_describe_stage(stage, data.context)}")
+    stage_fn = _STAGE_FUNCTIONS.get(stage, generate_with_llama)
+    return await asyncio.get_running_loop().run_in_executor(
+        PROMPT_EXECUTOR, stage_fn, data.prompt, data.context, generation_config
+    )
+
 # ============================================
 # ENDPOINT 1: DOCUMENT EXTRACTION
 # ============================================
-@app.post("/prompt")
+# Documentation only - responses are returned pre-serialized, never validated against it
+@app.post("/prompt", responses={200: {"model": PromptResponse}})
 async def prompt_endpoint(request: Request, data: PromptInput):
     """
     Send prompt to Mixtral 8x7B and get AI-generated output.
@@ -280,16 +452,23 @@ async def prompt_endpoint(request: Request, data: PromptInput):
     
     Response format: {"success": bool, "output": dict|str, "metadata": {...}}
     No Pydantic validation to allow dynamic response structure from Mixtral.
+    With "stream": true (journal entries only) the response is the /prompt/stream event stream.
     
     Requires API key authentication.
     """
     await verify_api_key(request)
+    _check_prompt_size(data)
     
+    # Determine stage from context
+    stage = data.context.get('stage', 'journal_entry') if data.context else 'journal_entry'
+    
+    if data.stream:
+        return await _stream_journal_entry(data)
+    
+    global _inflight_prompts, _gpu_compaction_requested
+    _inflight_prompts += 1
     try:
-        prompt_start = asyncio.get_event_loop().time()
-        
-        # Determine stage from context
-        stage = data.context.get('stage', 'journal_entry') if data.context else 'journal_entry'
+        prompt_start = time.perf_counter()
         
         # Extract generation parameters from request
         generation_config = {
@@ -302,55 +481,48 @@ async def prompt_endpoint(request: Request, data: PromptInput):
         }
         
         logger.info(f"[PROMPT] 📨 Received {stage} request")
-        logger.info(f"[PROMPT] 📝 Prompt length: {len(data.prompt)} chars")
-        logger.info(f"[PROMPT] ⚙️  Generation config: max_tokens={data.max_tokens}, temp={data.temperature}, max_input={data.max_input_length}")
-        logger.info(f"[PROMPT] 🎯 Sending to Mixtral: {data.prompt[:100]}...")
         
-        # Route based on stage
-        if stage == 'math_validation':
-            # Stage 0.5: Math Validation (LLM-Powered)
-            logger.info(f"[PROMPT] 🧮 Stage 0.5: Math Validation")
-            from app.classification import classify_stage0_5_math
-            output = await asyncio.get_event_loop().run_in_executor(
-                None, classify_stage0_5_math, data.prompt, data.context, generation_config
-            )
-        elif stage == 'action_selection':
-            # Stage 1: Semantic Analysis + Action Selection
-            logger.info(f"[PROMPT] 🔍 Stage 1: Action Selection")
-            from app.classification import classify_stage1
-            output = await asyncio.get_event_loop().run_in_executor(
-                None, classify_stage1, data.prompt, data.context, generation_config
-            )
-        elif stage == 'entity_extraction':
-            # Stage 2.5: Entity Field Extraction (LLM-Powered)
-            entity_types = data.context.get('entity_types', []) if data.context else []
-            logger.info(f"[PROMPT] 🔍 Stage 2.5: Entity Field Extraction for {len(entity_types)} entity types: {entity_types}")
-            from app.classification import classify_stage2_5_entity_extraction
-            output = await asyncio.get_event_loop().run_in_executor(
-                None, classify_stage2_5_entity_extraction, data.prompt, data.context, generation_config
-            )
-        elif stage == 'field_mapping' or stage == 'field_mapping_batch':
-            # Stage 4: Field Mapping (single action or batch)
-            if stage == 'field_mapping_batch':
-                action_count = data.context.get('action_count', 'unknown') if data.context else 'unknown'
-                actions = data.context.get('actions', []) if data.context else []
-                logger.info(f"[PROMPT] 🗺️  Stage 4: Batch Field Mapping for {action_count} actions: {actions}")
-            else:
-                action = data.context.get('action', 'unknown') if data.context else 'unknown'
-                logger.info(f"[PROMPT] 🗺️  Stage 4: Field Mapping for {action}")
-            
-            from app.classification import classify_stage2
-            output = await asyncio.get_event_loop().run_in_executor(
-                None, classify_stage2, data.prompt, data.context, generation_config
-            )
+        prompt_key = request_key({"stage": stage, "context": data.context, "generation": generation_config}, data.prompt)
+        cache_source = None
+        cached_output = _prompt_cache.get(prompt_key) if PROMPT_CACHE_SIZE > 0 else None
+        
+        if cached_output is not None:
+            _prompt_cache.move_to_end(prompt_key)
+            output = copy.deepcopy(cached_output)
+            cache_source = "exact"
+            logger.info(f"[PROMPT] ♻️  Served {stage} from response cache")
+        elif prompt_key in _inflight_outputs:
+            # shield: this waiter disconnecting must not cancel the shared generation
+            logger.info(f"[PROMPT] 🔗 Identical {stage} request already in flight - sharing its result")
+            output = copy.deepcopy(await asyncio.shield(_inflight_outputs[prompt_key]))
+            cache_source = "inflight"
         else:
-            # Legacy: Journal Entry Generation
-            logger.info(f"[PROMPT] 📝 Legacy: Journal Entry Generation")
-            output = await asyncio.get_event_loop().run_in_executor(
-                None, generate_with_llama, data.prompt, data.context, generation_config
-            )
+            _check_capacity(stage)
+            logger.info(f"[PROMPT] 📝 Prompt length: {len(data.prompt)} chars")
+            logger.info(f"[PROMPT] ⚙️  Generation config: max_tokens={data.max_tokens}, temp={data.temperature}, max_input={data.max_input_length}")
+            logger.info(f"[PROMPT] 🎯 Sending to Mixtral: {data.prompt[:100]}...")
+            
+            inflight = asyncio.get_running_loop().create_future()
+            _inflight_outputs[prompt_key] = inflight
+            try:
+                output = await _run_prompt_stage(stage, data, generation_config)
+                inflight.set_result(output)
+            except Exception as e:
+                inflight.set_exception(e)
+                inflight.exception()  # Retrieved here - waiters (if any) re-raise it themselves
+                raise
+            finally:
+                _inflight_outputs.pop(prompt_key, None)
+                if not inflight.done():
+                    inflight.cancel()
+            
+            # Fallback journal entries (parse failures) are not cached - a retry should regenerate
+            if PROMPT_CACHE_SIZE > 0 and not (isinstance(output, dict) and output.get("reference") == "System Generated"):
+                _prompt_cache[prompt_key] = copy.deepcopy(output)
+                if len(_prompt_cache) > PROMPT_CACHE_SIZE:
+                    _prompt_cache.popitem(last=False)
         
-        prompt_time = asyncio.get_event_loop().time() - prompt_start
+        prompt_time = time.perf_counter() - prompt_start
         logger.info(f"[PROMPT] ⏱️  Total prompt processing time: {prompt_time:.1f}s")
         
         # Preserve output structure (dict or string)
@@ -362,16 +534,29 @@ async def prompt_endpoint(request: Request, data: PromptInput):
                 "generated_at": get_timestamp(),
                 "prompt_length": len(data.prompt),
                 "context_provided": data.context is not None,
-                "model": "mistralai/Mixtral-8x7B-Instruct-v0.1",
+                "model": RESPONSE_MODEL_NAME,
                 "output_type": type(output).__name__,
                 "processing_time_seconds": round(prompt_time, 2)
             }
         }
+        if cache_source is not None:
+            response_data["metadata"]["cache"] = cache_source
         
-        logger.info(f"[PROMPT] ✅ Success! Output type: {type(output).__name__}, response size: {len(str(output))} chars")
+        # Return plain JSON (no Pydantic validation) to preserve dynamic structure.
+        # The body is serialized here, once - its length is the logged size (no str(output) repr)
+        response = FastJSONResponse(content=response_data)
+        logger.info(f"[PROMPT] ✅ Success! Output type: {type(output).__name__}, response size: {len(response.body)} bytes")
+        return response
         
-        # Return plain JSON (no Pydantic validation) to preserve dynamic structure
-        return JSONResponse(content=response_data)
+    except HTTPException:
+        raise
+        
+    except torch.cuda.OutOfMemoryError:
+        # VRAM exhausted (before RuntimeError - OutOfMemoryError subclasses it)
+        logger.error(f"[PROMPT] CUDA OOM - VRAM exhausted")
+        # Compacted by _maybe_empty_cache() once this request has released its tensors
+        _gpu_compaction_requested = True
+        raise HTTPException(status_code=507, detail="GPU memory exhausted. Try again in a moment.")
         
     except RuntimeError as e:
         # Model initialization errors
@@ -381,24 +566,94 @@ async def prompt_endpoint(request: Request, data: PromptInput):
             raise HTTPException(status_code=503, detail="Model not loaded. Service starting up.")
         raise HTTPException(status_code=500, detail=f"Model error: {error_msg}")
         
-    except torch.cuda.OutOfMemoryError:
-        # VRAM exhausted
-        logger.error(f"[PROMPT] CUDA OOM - VRAM exhausted")
-        torch.cuda.empty_cache()
-        raise HTTPException(status_code=507, detail="GPU memory exhausted. Try again in a moment.")
-        
     except Exception as e:
         # Other errors
         logger.error(f"[PROMPT] Failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Prompt generation failed: {str(e)}")
+    
+    finally:
+        _inflight_prompts -= 1
+        _schedule_gpu_reclaim()
+
+@app.post("/prompt/stream")
+async def prompt_stream_endpoint(request: Request, data: PromptInput):
+    """
+    Journal entry generation streamed as Server-Sent Events.
+    
+    Emits `delta` events with decoded text as Mixtral generates it, then one
+    `entry` event with the parsed journal entry (or an `error` event), then a
+    `metadata` event. Generation stops as soon as the JSON object closes.
+    
+    Requires API key authentication.
+    """
+    await verify_api_key(request)
+    _check_prompt_size(data)
+    return await _stream_journal_entry(data)
+
+async def _stream_journal_entry(data: PromptInput) -> StreamingResponse:
+    """SSE response streaming one journal entry (see prompt_stream_endpoint)."""
+    # Checked here so /prompt ("stream": true) and /prompt/stream both enforce it
+    stage = data.context.get('stage', 'journal_entry') if data.context else 'journal_entry'
+    if stage != 'journal_entry':
+        raise HTTPException(status_code=400, detail=f"Streaming is only supported for journal entries, not {stage}")
+    processor = await asyncio.to_thread(get_llama_processor)
+    logger.info(f"[PROMPT] 📨 Received streamed journal_entry request ({len(data.prompt)} chars)")
+    _check_capacity("streamed journal_entry")
+    
+    def events():
+        # Sync generator, iterated in a threadpool by counted() below - off the event loop
+        global _gpu_compaction_requested
+        stream_start = time.perf_counter()
+        try:
+            for event in processor.stream_journal_entry(data.prompt, data.context):
+                name, payload = next(iter(event.items()))
+                yield f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+        except torch.cuda.OutOfMemoryError:
+            logger.error(f"[PROMPT] CUDA OOM during streamed generation - VRAM exhausted")
+            _gpu_compaction_requested = True  # Compacted once counted() schedules the reclaim
+            yield f"event: error\ndata: {json.dumps({'detail': 'GPU memory exhausted. Try again in a moment.'})}\n\n"
+        except Exception as e:
+            logger.error(f"[PROMPT] Streamed generation failed: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+        metadata = {
+            "generated_at": get_timestamp(),
+            "prompt_length": len(data.prompt),
+            "context_provided": data.context is not None,
+            "model": RESPONSE_MODEL_NAME,
+            "processing_time_seconds": round(time.perf_counter() - stream_start, 2)
+        }
+        yield f"event: metadata\ndata: {json.dumps(metadata)}\n\n"
+    
+    async def counted():
+        # Counted like /prompt generations until the stream ends (or the client disconnects).
+        # Raised here, not when the response is built: a generator that never starts (client
+        # gone before the body is sent) never runs its finally, and the counts would leak
+        global _inflight_prompts, _inflight_streams
+        _inflight_prompts += 1
+        _inflight_streams += 1
+        try:
+            async for chunk in iterate_in_threadpool(events()):
+                yield chunk
+        finally:
+            _inflight_prompts -= 1
+            _inflight_streams -= 1
+            _schedule_gpu_reclaim()
+    
+    return StreamingResponse(counted(), media_type="text/event-stream")
 
 # ============================================
 # HELPER FUNCTIONS
 # ============================================
+_timestamp_cache = [0, ""]  # [whole second, formatted timestamp]
+
 def get_timestamp() -> str:
-    """Get current timestamp."""
-    from datetime import datetime
-    return datetime.now().isoformat()
+    """Get current timestamp (second resolution, formatted once per second)."""
+    now = int(time.time())
+    if now != _timestamp_cache[0]:
+        # String first: a reader on another thread (SSE generators) never pairs the new second with the old string
+        _timestamp_cache[1] = datetime.fromtimestamp(now).isoformat()
+        _timestamp_cache[0] = now
+    return _timestamp_cache[1]
 
 if __name__ == "__main__":
     import uvicorn
@@ -416,5 +671,7 @@ if __name__ == "__main__":
         reload=False,  # Disable reload in production
         workers=1,     # Single worker for GPU memory management
         timeout_keep_alive=30,
-        access_log=True
+        loop="uvloop",       # libuv event loop (uvicorn[standard])
+        http="httptools",    # C HTTP parser instead of h11
+        access_log=False     # Requests are logged by the [PROMPT] lines
     )
\ No newline at end of file
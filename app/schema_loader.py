@@ -7,10 +7,17 @@ for schema management and caching.
 
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, Optional
 import logging
 
+try:
+    import orjson  # C JSON parser, several times faster than json.load on schema files
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 # Base directory for schemas
@@ -18,6 +25,35 @@ SCHEMAS_DIR = Path(__file__).parent.parent / "schemas"
 
 # Schema cache to avoid repeated file reads
 _schema_cache: Dict[str, Any] = {}
+# Per-path locks serialize cache misses, so concurrent first requests don't each parse
+# the same file while loads of different files (e.g. the preload) still overlap
+_schema_load_locks: Dict[str, threading.Lock] = {}
+_schema_load_locks_lock = threading.Lock()
+# Stage 4 action wrappers by (software, action name) - successful loads only, so a
+# transient read error on the network volume is retried by the next request
+_stage_4_action_schemas: Dict[tuple, Dict[str, Any]] = {}
+
+# Static parts of the Stage 4 wrapper, shared by reference by every wrapped schema
+_LOOKUPS_REQUIRED_SCHEMA = {
+    "type": "array",
+    "items": {"type": "string"},
+    "description": "Entity placeholders like ${account:123}"
+}
+_VALIDATION_SCHEMA = {
+    "type": "object",
+    "required": ["is_valid"],
+    "properties": {
+        "is_valid": {"type": "boolean"},
+        "missing_required_fields": {
+            "type": "array",
+            "items": {"type": "string"}
+        },
+        "warnings": {
+            "type": "array",
+            "items": {"type": "string"}
+        }
+    }
+}
 
 
 def load_schema(schema_path: str) -> Optional[Dict[str, Any]]:
@@ -29,30 +65,41 @@ def load_schema(schema_path: str) -> Optional[Dict[str, Any]]:
                     e.g., "stage_2_5/entity_extraction_base.json"
     
     Returns:
-        Loaded JSON schema dict or None if not found
+        Loaded JSON schema dict or None if not found. The dict is shared by every
+        caller - treat it as read-only (copy before modifying).
     """
     # Check cache first
     if schema_path in _schema_cache:
         logger.debug(f"[Schema Loader] Cache hit: {schema_path}")
         return _schema_cache[schema_path]
     
-    # Load from file
+    with _schema_load_locks_lock:
+        path_lock = _schema_load_locks.setdefault(schema_path, threading.Lock())
+    with path_lock:
+        # Another thread may have loaded it while we waited
+        if schema_path in _schema_cache:
+            return _schema_cache[schema_path]
+        return _load_schema_file(schema_path)
+
+
+def _load_schema_file(schema_path: str) -> Optional[Dict[str, Any]]:
+    """Read, parse and cache one schema file (caller holds its path lock)."""
     full_path = SCHEMAS_DIR / schema_path
     
-    if not full_path.exists():
-        logger.error(f"[Schema Loader] Schema not found: {full_path}")
-        return None
-    
     try:
-        with open(full_path, 'r', encoding='utf-8') as f:
-            schema = json.load(f)
+        # One read of the whole file (no exists() stat first - a round trip on the network volume)
+        raw = full_path.read_bytes()
+        schema = orjson.loads(raw) if orjson is not None else json.loads(raw)
         
         # Cache for future use
         _schema_cache[schema_path] = schema
         logger.info(f"[Schema Loader] Loaded schema: {schema_path}")
         return schema
         
-    except json.JSONDecodeError as e:
+    except FileNotFoundError:
+        logger.error(f"[Schema Loader] Schema not found: {full_path}")
+        return None
+    except json.JSONDecodeError as e:  # orjson.JSONDecodeError subclasses it
         logger.error(f"[Schema Loader] Invalid JSON in {schema_path}: {e}")
         return None
     except Exception as e:
@@ -95,40 +142,27 @@ def get_stage_4_schema(is_batch: bool = False, action_name: Optional[str] = None
     """
     # Priority 1: Action-specific schema (most precise, eliminates field hallucination)
     if action_name:
+        # The wrapper is built, and its log line written, once per action
+        wrapped = _stage_4_action_schemas.get((software, action_name))
+        if wrapped is not None:
+            return wrapped
         action_schema_path = f"stage_4/actions/{software}/{action_name}.json"
         action_schema = load_schema(action_schema_path)
         if action_schema:
             logger.info(f"✅ [Stage 4] Using action-specific schema for {action_name}")
-            # Wrap action schema in field_mapping structure for Stage 4 output
-            return {
+            # Wrap action schema in field_mapping structure for Stage 4 output.
+            # setdefault: concurrent first requests all get the same (first) wrapper
+            return _stage_4_action_schemas.setdefault((software, action_name), {
                 "$schema": "http://json-schema.org/draft-07/schema#",
                 "type": "object",
                 "required": ["api_request_body"],
                 "properties": {
                     "api_request_body": action_schema,
-                    "lookups_required": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "Entity placeholders like ${account:123}"
-                    },
-                    "validation": {
-                        "type": "object",
-                        "required": ["is_valid"],
-                        "properties": {
-                            "is_valid": {"type": "boolean"},
-                            "missing_required_fields": {
-                                "type": "array",
-                                "items": {"type": "string"}
-                            },
-                            "warnings": {
-                                "type": "array",
-                                "items": {"type": "string"}
-                            }
-                        }
-                    }
+                    "lookups_required": _LOOKUPS_REQUIRED_SCHEMA,
+                    "validation": _VALIDATION_SCHEMA
                 },
                 "additionalProperties": False
-            }
+            })
         else:
             logger.warning(f"⚠️  [Stage 4] Action schema not found for {action_name}, falling back to generic")
     
@@ -139,10 +173,23 @@ def get_stage_4_schema(is_batch: bool = False, action_name: Optional[str] = None
         return load_schema("stage_4/field_mapping_single.json")
 
 
+def preload_action_schemas(actions: Iterable[str], software: str = 'zohobooks'):
+    """
+    Load the Stage 4 schemas for the given actions ahead of their first request.
+    
+    Action schemas are deliberately not preloaded at import (there are 200+ and every
+    worker cold start would pay for them); call this once the actions a worker
+    serves are known.
+    """
+    for action_name in actions:
+        get_stage_4_schema(is_batch=False, action_name=action_name, software=software)
+
+
 def clear_cache():
     """Clear the schema cache (useful for testing or hot-reloading)."""
     global _schema_cache
     _schema_cache.clear()
+    _stage_4_action_schemas.clear()
     logger.info("[Schema Loader] Cache cleared")
 
 
@@ -167,14 +214,18 @@ def validate_schema(schema: Dict[str, Any]) -> bool:
 
 # Pre-load schemas at module import for faster access
 def _preload_schemas():
-    """Pre-load common schemas into cache."""
+    """Pre-load common schemas into cache (action schemas load on first use)."""
+    # /workspace is a network volume: per-file latency dominates, so overlap the reads
+    paths = [
+        "stage_1/semantic_analysis.json",
+        "stage_2_5/entity_extraction_base.json",
+        "stage_4/field_mapping_single.json",
+        "stage_4/field_mapping_batch.json",
+    ]
     try:
-        get_stage_2_5_schema()
-        logger.info("[Schema Loader] Pre-loaded Stage 2.5 schema")
-        get_stage_4_schema(is_batch=False)
-        logger.info("[Schema Loader] Pre-loaded Stage 4 single schema")
-        get_stage_4_schema(is_batch=True)
-        logger.info("[Schema Loader] Pre-loaded Stage 4 batch schema")
+        with ThreadPoolExecutor(max_workers=len(paths), thread_name_prefix="schema-preload") as executor:
+            loaded = sum(schema is not None for schema in executor.map(load_schema, paths))
+        logger.info(f"[Schema Loader] Pre-loaded {loaded}/{len(paths)} schemas")
     except Exception as e:
         logger.warning(f"[Schema Loader] Could not pre-load schemas: {e}")
 
@@ -7,12 +7,21 @@ print("HANDLER.PY STARTING - BEFORE IMPORTS", flush=True)
 
 import os
 import sys
+import json
 import logging
+import traceback
 from pathlib import Path
 from typing import Any, Dict
 
 print("HANDLER.PY - IMPORTS COMPLETE", flush=True)
 
+# Configure logging before app imports (app.llama_utils loads the model at import time)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
 # ============================================
 # 1. ENVIRONMENT SETUP
 # ============================================
@@ -30,6 +39,8 @@ os.environ['HF_HUB_CACHE'] = str(VOLUME_PATH / "huggingface")
 os.environ['TORCH_HOME'] = str(VOLUME_PATH / "torch")
 os.environ['XDG_CACHE_HOME'] = str(VOLUME_PATH)
 os.environ['BNB_CUDA_VERSION'] = '128'  # CUDA 12.8 for PyTorch 2.8.0+cu128
+# Allocator config is read when CUDA initializes - must be set before `import torch` below
+os.environ.setdefault('PYTORCH_CUDA_ALLOC_CONF', 'expandable_segments:True,max_split_size_mb:512,garbage_collection_threshold:0.8')
 
 print(f"✅ Model cache: {VOLUME_PATH / 'huggingface'}", flush=True)
 print(f"✅ BNB_CUDA_VERSION: 128 (CUDA 12.8 for sm_120 support)", flush=True)
@@ -105,17 +116,9 @@ try:
     print(f"  ✅ FastAPI endpoint imported", flush=True)
 except ImportError as e:
     print(f"  ❌ Failed to import FastAPI endpoint: {e}", flush=True)
-    import traceback
     traceback.print_exc()
     sys.exit(1)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
 # ============================================
 # 3. MODEL INITIALIZATION
 # ============================================
@@ -143,21 +146,37 @@ try:
 except Exception as e:
     print(f"⚠️  Model pre-load failed: {e}", flush=True)
     print(f"   Model will be loaded on first request (slower)", flush=True)
-    import traceback
     traceback.print_exc()
     model_loaded = False
 
 # ============================================
 # 4. CALLBACK HELPER
 # ============================================
+import aiohttp
+
+# One session for all callbacks: keeps the TCP/TLS connection to the backend alive
+# between jobs instead of a new handshake per callback. Bound to the worker's event
+# loop, so it's created lazily on first use (and again if that loop changed).
+_callback_session = None
+_callback_session_loop = None
+
+def _get_callback_session():
+    global _callback_session, _callback_session_loop
+    loop = asyncio.get_running_loop()
+    if _callback_session is None or _callback_session.closed or _callback_session_loop is not loop:
+        _callback_session_loop = loop
+        _callback_session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=30),
+            connector=aiohttp.TCPConnector(limit=20, keepalive_timeout=60),
+        )
+    return _callback_session
+
 async def send_callback(job_id: str, callback_url: str, callback_api_key: str, status: str, result: Dict[str, Any] = None, error: str = None):
     """
     Send callback to backend when job completes
     Replaces polling with push-based updates
     """
     try:
-        import aiohttp
-        
         payload = {
             'job_id': job_id,
             'status': status,
@@ -171,18 +190,15 @@ async def send_callback(job_id: str, callback_url: str, callback_api_key: str, s
         
         logger.info(f"[Callback] Sending {status} callback for job {job_id} to {callback_url}")
         
-        timeout = aiohttp.ClientTimeout(total=30)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.post(callback_url, json=payload) as response:
-                if response.status == 200:
-                    logger.info(f"[Callback] ✅ Callback successful for job {job_id}")
-                else:
-                    logger.error(f"[Callback] ❌ Callback failed for job {job_id}: HTTP {response.status}")
-                    resp_text = await response.text()
-                    logger.error(f"[Callback] Response: {resp_text[:500]}")
+        async with _get_callback_session().post(callback_url, json=payload) as response:
+            if response.status == 200:
+                logger.info(f"[Callback] ✅ Callback successful for job {job_id}")
+            else:
+                logger.error(f"[Callback] ❌ Callback failed for job {job_id}: HTTP {response.status}")
+                resp_text = await response.text()
+                logger.error(f"[Callback] Response: {resp_text[:500]}")
     except Exception as e:
         logger.error(f"[Callback] ❌ Failed to send callback for job {job_id}: {e}")
-        import traceback
         logger.error(traceback.format_exc()[:1000])
 
 # ============================================
@@ -231,6 +247,12 @@ async def async_handler(job: Dict[str, Any]) -> Dict[str, Any]:
             logger.info(f"[RunPod] Processing prompt ({len(data.get('prompt', ''))} chars)")
             
             try:
+                # A job result is one JSON payload - an SSE StreamingResponse can't be returned
+                # (or sent to the callback), so "stream" jobs get the complete entry instead
+                if data.get('stream'):
+                    logger.info("[RunPod] Streaming is not available for jobs - returning the complete output")
+                    data = {**data, 'stream': False}
+                
                 # Validate and create input
                 input_data = PromptInput(**data)
                 
@@ -239,7 +261,6 @@ async def async_handler(job: Dict[str, Any]) -> Dict[str, Any]:
                 
                 # Convert result to dict
                 if hasattr(result, 'body'):
-                    import json
                     result_dict = json.loads(result.body.decode('utf-8'))
                 elif isinstance(result, dict):
                     result_dict = result
@@ -262,7 +283,6 @@ async def async_handler(job: Dict[str, Any]) -> Dict[str, Any]:
                     
             except Exception as e:
                 logger.error(f"[RunPod] Prompt failed: {e}")
-                import traceback
                 error_result = {
                     "success": False,
                     "error": str(e),
@@ -316,7 +336,6 @@ async def async_handler(job: Dict[str, Any]) -> Dict[str, Any]:
     
     except Exception as e:
         logger.error(f"[RunPod] Handler error: {e}")
-        import traceback
         return {
             "success": False,
             "error": str(e),
@@ -342,6 +361,5 @@ if __name__ == "__main__":
         logger.info("RunPod worker registered successfully")
     except Exception as e:
         logger.error(f"Failed to start RunPod worker: {e}")
-        import traceback
         traceback.print_exc()
         raise
@@ -4,9 +4,13 @@ Initialize models on first startup.
 Downloads models to network volume only if not already cached.
 """
 import os
+import logging
 import sys
 from pathlib import Path
 
+# Show model loading progress from app.llama_utils
+logging.basicConfig(level=logging.INFO)
+
 def check_and_download_models():
     """Check if models exist, download if needed (LLM-only service)."""
     
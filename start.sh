@@ -142,5 +142,8 @@ exec uvicorn app.main:app \
     --port ${PORT:-8000} \
     --workers 1 \
     --timeout-keep-alive 60 \
+    --loop uvloop \
+    --http httptools \
+    --no-access-log \
     --log-level ${LOG_LEVEL:-info} \
     $([ "${DEBUG}" == "true" ] && echo "--reload" || echo "")
\ No newline at end of file
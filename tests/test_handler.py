@@ -0,0 +1,72 @@
+"""
+Tests for the RunPod handler's /prompt path.
+
+No model is loaded: generation is replaced with a canned output, so these need the
+service's Python dependencies but not a GPU.
+"""
+
+import asyncio
+import os
+
+import pytest
+
+# Keep app.llama_utils from loading Mixtral at import
+os.environ.setdefault("ZOPILOT_EAGER_LOAD", "0")
+
+for _module in ("torch", "fastapi", "runpod", "aiohttp"):
+    pytest.importorskip(_module)
+
+import app.llama_utils as llama_utils
+
+
+def _no_model():
+    raise RuntimeError("Model not initialized")
+
+
+@pytest.fixture(scope="module")
+def handler():
+    # handler.py pre-loads the model at import - make that a (logged) no-op
+    original = llama_utils.get_llama_processor
+    llama_utils.get_llama_processor = _no_model
+    try:
+        import handler as handler_module
+    finally:
+        llama_utils.get_llama_processor = original
+    return handler_module
+
+
+@pytest.fixture
+def main(monkeypatch):
+    import app.main as main_module
+
+    async def fake_stage(stage, data, generation_config):
+        return {"description": "Office supplies", "stage": stage}
+
+    monkeypatch.setattr(main_module, "_run_prompt_stage", fake_stage)
+    monkeypatch.setattr(main_module, "_API_KEY_BYTES", None)
+    monkeypatch.setattr(main_module, "PROMPT_CACHE_SIZE", 0)
+    monkeypatch.setattr(main_module, "GPU_RECLAIM_IDLE_SECONDS", 0)
+    return main_module
+
+
+def _inflight_counters(main):
+    return main._inflight_prompts, main._inflight_streams, len(main._inflight_outputs)
+
+
+def test_stream_job_returns_complete_output_and_leaves_inflight_counters(handler, main):
+    before = _inflight_counters(main)
+    job = {
+        "id": "job-stream",
+        "input": {
+            "endpoint": "/prompt",
+            "data": {"prompt": "Record a 12.50 USD office supplies receipt", "stream": True},
+        },
+    }
+
+    result = asyncio.run(handler.async_handler(job))
+
+    assert result["success"] is True
+    assert result["output"] == {"description": "Office supplies", "stage": "journal_entry"}
+    assert _inflight_counters(main) == before
+    # The job's own input is not modified
+    assert job["input"]["data"]["stream"] is True
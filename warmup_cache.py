@@ -10,10 +10,14 @@ Or call via HTTP:
     curl -X POST https://your-endpoint.runpod.io/warmup
 """
 import os
+import logging
 import sys
 import time
 from pathlib import Path
 
+# Show model loading progress from app.llama_utils
+logging.basicConfig(level=logging.INFO)
+
 def warmup_models():
     """Download and cache all models."""
     print("=" * 80)